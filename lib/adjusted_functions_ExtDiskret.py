@@ -16,8 +16,10 @@ import scipy.stats as st
 import numpy as np
 import math
 
-def fixedRate(rate):
-    return rate
+def fixedRate(rate, size = None):
+    if size is None:
+        return rate
+    return np.full(size, rate, dtype=float)
     
 
 class ReleaseFunction(object):
@@ -67,45 +69,71 @@ class ReleaseFunction(object):
         at a specific period.  
         """
         par = self.parameters
-        sum_rate = 0
         if len(par) == 2:   # loc = 0
-            c = par[0]
-            scale = par[1]
-            for j in range (2,30):  #calculate sum over weibull function except for service lifetime = 1
-                frozenWeib = st.exponweib(1, c, 0, scale)
-                weib_rate = 0.5*(frozenWeib.pdf(j-0.5)-frozenWeib.pdf(j))+frozenWeib.pdf(j)
-                sum_rate += weib_rate
-                
-            if period ==0:  # weibull function should not become infinite if c<1
-                   rate = 0
-
-            elif period ==1: 
-                   rate = 1-sum_rate #sum over weibull function should equal 1, all material gets released in the end
-            else:
-                frozenWeib = st.exponweib(1, c, 0, scale)
-                rate = 0.5*(frozenWeib.pdf(period-0.5)-frozenWeib.pdf(period))+frozenWeib.pdf(period)
-            return rate
-            
+            loc = 0
+            kernel = weibullKernel(par[0], par[1])
         elif len(par) == 3: # loc defined by user
-            c = par[0]
-            scale = par[1]
             loc = par[2]
-            ceil = math.ceil(loc)
-            for j in range (ceil+1,30): #calculate sum over weibull function except for service lifetime <=loc
-                frozenWeib = st.exponweib(1, c, loc, scale)
-                weib_rate = 0.5*(frozenWeib.pdf(j-0.5)-frozenWeib.pdf(j))+frozenWeib.pdf(j)
-                sum_rate += weib_rate
-                
-            if period < ceil: # weibull function should not become infinite if c<1
-                   rate = 0
-                   
-            elif period == ceil:
-                   rate = 1-sum_rate #sum over weibull function should equal 1, all material gets released in the end
-            else:
-                frozenWeib = st.exponweib(1, c, loc, scale)
-                rate = 0.5*(frozenWeib.pdf(period-0.5)-frozenWeib.pdf(period))+frozenWeib.pdf(period)
-            return rate
+            kernel = weibullKernel(par[0], par[1], par[2])
         else:
             print('ERROR:')
             print('Too few or too many arguments for weibull release function.')
             print('Enter two or three arguments for weibull release function.')
+            return
+
+        if period < len(kernel):
+            return kernel[period]
+        frozenWeib = st.exponweib(1, par[0], loc, par[1])
+        return 0.5*(frozenWeib.pdf(period-0.5)-frozenWeib.pdf(period)) + \
+               frozenWeib.pdf(period)
+
+
+
+# discretized weibull release rates by (c, scale, loc, delay)
+weibullKernels = {}
+
+def weibullKernel(c, scale, loc = None, delay = 0):
+    """
+    Returns the release rates of a weibull release function for the 500
+    periods after the storage period (the maximum length of a release), 
+    preceded by delay periods without release. The rates are memoized by
+    (c, scale, loc, delay).
+
+    The rate of a period is the discretized density 
+    0.5*(pdf(period-0.5) - pdf(period)) + pdf(period). Nothing is released
+    before the first period after loc (period 1, if loc is not defined by the
+    user); this period gets the share that makes the rates up to period 29
+    sum up to one.
+
+    Parameters:
+    ----------------
+    c, scale: float
+        shape and scale of the weibull distribution
+    loc: float
+        location of the weibull distribution, None if not defined by the user
+    delay: integer
+        number of periods without release before the rates
+    """
+    key = (c, scale, loc, delay)
+    if key not in weibullKernels:
+        if loc is None:
+            first = 1
+            frozenWeib = st.exponweib(1, c, 0, scale)
+        else:
+            first = math.ceil(loc)
+            frozenWeib = st.exponweib(1, c, loc, scale)
+
+        periods = np.arange(first + 1, max(500, first + 1))
+        # one evaluation of the density for all half and full periods
+        pdf = frozenWeib.pdf(np.concatenate((periods - 0.5, periods)))
+        rates = 0.5*(pdf[:len(periods)] - pdf[len(periods):]) + \
+                pdf[len(periods):]
+        # all material gets released in the end
+        sum_rate = sum(rates[:max(29 - first, 0)])
+
+        kernel = np.zeros(delay + first + 1 + len(periods))
+        kernel[delay + first] = 1 - sum_rate
+        kernel[delay + first + 1:] = rates
+        kernel.flags.writeable = False
+        weibullKernels[key] = kernel
+    return weibullKernels[key]
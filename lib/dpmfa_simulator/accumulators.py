@@ -0,0 +1,267 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+"""
+Created in October 2026
+
+The accumulators module contains online statistics that summarize the record
+of a quantity over all simulation runs period by period, without keeping the
+values of the single runs. The Simulator uses them in its streaming mode, the
+exporter and the entropy calculation read them with the functions mean,
+median and percentile, which accept full (runs, periods) records as well.
+"""
+
+import numpy as np
+
+
+class RecordStatistics(object):
+    """ Accumulates the mean, the variance and a quantile sketch of a record
+    for every period.
+
+    Mean and variance are updated with the batch version of Welford's
+    algorithm. The quantiles are estimated with a merging t-digest: the values
+    of a period are kept as weighted centroids, which hold single values at
+    the tails of the distribution and get larger towards its median.
+    Statistics of different chunks or processes can be merged.
+
+    Parameters:
+    ----------------
+    periods: integer
+        the number of periods of the record
+    compression: integer
+        the t-digest compression; every period keeps at most \
+        compression/2 + 1 centroids. If None, no quantile sketch is kept.
+    """
+    def __init__(self, periods, compression = 200):
+        self.periods = periods
+        self.compression = compression
+        self.count = 0
+        self.meanValues = np.zeros(periods)
+        self.sumOfSquares = np.zeros(periods)
+        self.minimum = np.full(periods, np.inf)
+        self.maximum = np.full(periods, -np.inf)
+        self.centroidMeans = np.zeros((periods, 0))
+        self.centroidWeights = np.zeros((periods, 0))
+
+
+    def update(self, values):
+        """ adds a block of runs (array of shape (runs, periods)) or the
+        statistics of other runs (RecordStatistics) to the statistics
+        """
+        if isinstance(values, RecordStatistics):
+            if values.count == 0:
+                return
+            self.__addMoments(values.count, values.meanValues,
+                              values.sumOfSquares)
+            self.minimum = np.minimum(self.minimum, values.minimum)
+            self.maximum = np.maximum(self.maximum, values.maximum)
+            if self.compression is not None:
+                self.__compress(values.centroidMeans, values.centroidWeights)
+            return
+
+        values = np.asarray(values, dtype=float).reshape(-1, self.periods)
+        if len(values) == 0:
+            return
+        blockMean = values.mean(axis=0)
+        self.__addMoments(len(values), blockMean,
+                          ((values - blockMean)**2).sum(axis=0))
+        self.minimum = np.minimum(self.minimum, values.min(axis=0))
+        self.maximum = np.maximum(self.maximum, values.max(axis=0))
+        if self.compression is not None:
+            self.__compress(values.T, np.ones(values.T.shape))
+
+
+    def __addMoments(self, count, meanValues, sumOfSquares):
+        total = self.count + count
+        delta = meanValues - self.meanValues
+        self.meanValues = self.meanValues + delta * count / total
+        self.sumOfSquares = self.sumOfSquares + sumOfSquares + \
+                            delta**2 * self.count * count / total
+        self.count = total
+
+
+    def __compress(self, means, weights):
+        """ merges new centroids into the sketch. The centroids of a period
+        are sorted and grouped by the t-digest scale function
+        k(q) = compression/(2 pi) * arcsin(2q - 1) of their quantile q.
+        """
+        means = np.concatenate((self.centroidMeans, means), axis=1)
+        weights = np.concatenate((self.centroidWeights, weights), axis=1)
+
+        order = np.argsort(means, axis=1, kind='stable')
+        means = np.take_along_axis(means, order, axis=1)
+        weights = np.take_along_axis(weights, order, axis=1)
+
+        quantiles = (np.cumsum(weights, axis=1) - weights/2) / self.count
+        numCentroids = self.compression//2 + 1
+        scale = self.compression/(2*np.pi) * \
+                np.arcsin(np.clip(2*quantiles - 1, -1, 1)) + self.compression/4
+        groups = np.clip(scale.astype(int), 0, numCentroids - 1) + \
+                 numCentroids * np.arange(self.periods)[:, np.newaxis]
+
+        size = self.periods * numCentroids
+        newWeights = np.bincount(groups.ravel(), weights.ravel(), size)
+        newSums = np.bincount(groups.ravel(), (weights*means).ravel(), size)
+        newMeans = np.divide(newSums, newWeights, out=np.zeros(size),
+                             where=newWeights > 0)
+        self.centroidMeans = newMeans.reshape(self.periods, numCentroids)
+        self.centroidWeights = newWeights.reshape(self.periods, numCentroids)
+
+
+    def mean(self):
+        """ returns the mean of every period """
+        return self.meanValues.copy()
+
+
+    def variance(self):
+        """ returns the sample variance of every period """
+        if self.count < 2:
+            return np.zeros(self.periods)
+        return self.sumOfSquares / (self.count - 1)
+
+
+    def standardError(self):
+        """ returns the standard error of the mean of every period """
+        if self.count < 2:
+            return np.full(self.periods, np.inf)
+        return np.sqrt(self.variance() / self.count)
+
+
+    def percentile(self, q):
+        """ returns the estimated q-th percentile (0 <= q <= 100) of every
+        period, interpolated linearly between the centroids like
+        numpy.percentile between the values of the runs
+        """
+        result = np.zeros(self.periods)
+        position = q/100. * (self.count - 1) + 0.5
+        for p in range(self.periods):
+            used = self.centroidWeights[p] > 0
+            weights = self.centroidWeights[p][used]
+            centers = np.cumsum(weights) - weights/2
+            result[p] = np.interp(position,
+                        np.concatenate(([0.5], centers, [self.count - 0.5])),
+                        np.concatenate(([self.minimum[p]],
+                                        self.centroidMeans[p][used],
+                                        [self.maximum[p]])))
+        return result
+
+
+    def median(self):
+        """ returns the estimated median of every period """
+        return self.percentile(50)
+
+
+
+class ConvergenceMonitor(object):
+    """ Tracks the precision of the Monte Carlo estimates of a set of
+    records over chunks of runs.
+
+    The standard error of the mean of a record is calculated from the values
+    of all runs. The standard error of a percentile is estimated with the
+    method of batch means: the percentile is estimated for every chunk on its
+    own and the standard error is derived from the spread of these estimates.
+    With paired runs (antithetic sampling), the two runs of a pair are not
+    independent; the standard error of the mean is then calculated from the
+    means of the pairs.
+
+    Parameters:
+    ----------------
+    periods: integer
+        the number of periods of the records
+    percentiles: list<float>
+        the percentiles (0 - 100) whose precision is tracked besides the mean
+    minChunks: integer
+        the minimum number of chunks before the estimates are considered \
+        converged
+    pairedRuns: boolean
+        if True, the runs of a chunk are consecutive pairs of dependent runs
+    """
+    def __init__(self, periods, percentiles = [], minChunks = 5, 
+                 pairedRuns = False):
+        self.periods = periods
+        self.percentiles = list(percentiles)
+        self.minChunks = minChunks
+        self.pairedRuns = pairedRuns
+        self.chunks = 0
+        self.runStatistics = {}
+        self.percentileStatistics = {}
+
+
+    def update(self, records):
+        """ adds a chunk of runs; records is a dictionary of arrays of shape
+        (runs, periods) with a key for every tracked record
+        """
+        self.chunks += 1
+        for key in records:
+            values = np.asarray(records[key], dtype=float)
+            runValues = values
+            if self.pairedRuns and len(values) % 2 == 0:
+                runValues = values.reshape(-1, 2, values.shape[1]).mean(1)
+            self.runStatistics.setdefault(key, RecordStatistics(self.periods,
+                                          None)).update(runValues)
+            if len(self.percentiles) != 0 and len(values) > 1:
+                estimates = np.percentile(values, self.percentiles, axis=0)
+                self.percentileStatistics.setdefault(key, RecordStatistics(
+                    len(self.percentiles) * self.periods, None)).update(
+                    estimates.ravel())
+
+
+    def precision(self):
+        """ returns the largest relative standard error of all tracked
+        estimates. Estimates without variation count as exact, estimates of
+        zero with variation as not converged.
+        """
+        precision = 0.
+        for statistics in (list(self.runStatistics.values()) + 
+                           list(self.percentileStatistics.values())):
+            if statistics.count < 2:
+                return np.inf
+            error = statistics.standardError()
+            estimate = np.abs(statistics.mean())
+            relativeError = np.divide(error, estimate, 
+                                      out=np.full(error.shape, np.inf),
+                                      where=estimate > 0)
+            relativeError[error == 0] = 0
+            if len(relativeError):
+                precision = max(precision, relativeError.max())
+        return precision
+
+
+    def converged(self, tolerance):
+        """ returns True, if all tracked estimates are within the relative
+        tolerance
+        """
+        return self.chunks >= self.minChunks and \
+               self.precision() <= tolerance
+
+
+
+def mean(record):
+    """ returns the mean of a record (RecordStatistics or array of shape
+    (runs, periods)) for every period
+    """
+    if isinstance(record, RecordStatistics):
+        return record.mean()
+    return np.mean(record, axis=0)
+
+
+def median(record):
+    """ returns the median of a record for every period """
+    if isinstance(record, RecordStatistics):
+        return record.median()
+    return np.median(record, axis=0)
+
+
+def percentile(record, q):
+    """ returns the q-th percentile of a record for every period """
+    if isinstance(record, RecordStatistics):
+        return record.percentile(q)
+    return np.percentile(record, q, axis=0)
+
+
+def runValues(record):
+    """ returns the values of the single runs of a record (none, if only its
+    statistics are kept)
+    """
+    if isinstance(record, RecordStatistics):
+        return []
+    return record
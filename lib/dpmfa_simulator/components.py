@@ -9,8 +9,161 @@ The components module contains model elements that are necessary to implement a
 Probabilistic Material Flow Model. To represent the system, the model elements
 need to be parametrized to fit the specific system behavior.
 """
+import os
+import tempfile
 import numpy as np
 from functools import reduce
+from . import distributions as ds
+
+
+
+def adjustTCBlock(tcs, priorities):
+    """ Adjusts the TCs of several runs (array of shape (runs, transfers))
+    to sum up to one for every run, with the same rules as
+    FlowCompartment.adjustTCs: starting with the lowest priority, the TCs of
+    one priority after the other are scaled until the sum is one. If all TCs
+    of a run are zero, they are set to 1/transfers; if all TCs of the current
+    priority are zero and the sum is smaller than one, the missing share is
+    split equally among them.
+
+    Parameters:
+    ----------------
+    tcs: array<float>, shape (runs, transfers)
+        the sampled TCs of the outgoing transfers of a compartment
+    priorities: list<integer>
+        the priority of every transfer
+
+    ------------
+    returns: the adjusted TCs, array of shape (runs, transfers)
+    """
+    tcs = np.array(tcs, dtype=float)
+    priorities = np.asarray(priorities)
+    numTransfers = tcs.shape[1]
+    tcSum = __sumColumns(tcs)
+    active = tcSum != 1
+    currentPriority = priorities.min()
+
+    while active.any() and currentPriority <= priorities.max():
+        adjustable = np.flatnonzero(priorities == currentPriority)
+        rows = np.flatnonzero(active)
+        block = tcs[rows]
+        blockSum = tcSum[rows]
+        adjustSum = __sumColumns(block[:, adjustable])
+        normToValue = np.maximum(adjustSum - (blockSum - 1), 0)
+
+        zeroSum = blockSum == 0
+        fill = ~zeroSum & (adjustSum == 0) & (blockSum < 1)
+        scale = ~zeroSum & (adjustSum != 0)
+
+        block[zeroSum] = 1.0/numTransfers
+        if len(adjustable):
+            adjustableTCs = block[:, adjustable]
+            adjustableTCs[fill] = ((1.0 - blockSum[fill]) / 
+                                   len(adjustable))[:, np.newaxis]
+            adjustableTCs[scale] = adjustableTCs[scale] / \
+                (adjustSum[scale]*1.0)[:, np.newaxis] * \
+                normToValue[scale, np.newaxis]
+            block[:, adjustable] = adjustableTCs
+        tcs[rows] = block
+
+        # round to 11 digits after the decimal point
+        newSum = np.round(__sumColumns(block), 12)
+        done = (np.trunc(newSum*100000000000) == 100000000000) | (newSum == 1)
+        tcSum[rows] = np.where(done, 1, newSum)
+        active[rows] = ~done
+        currentPriority = currentPriority + 1
+
+    return tcs
+
+
+def __sumColumns(values):
+    """ sums up the columns of a block in the order of the transfers, like
+    the built-in sum over the TCs of a single run
+    """
+    total = np.zeros(len(values))
+    for i in range(values.shape[1]):
+        total = total + values[:, i]
+    return total
+
+
+def futureReleaseKernel(releaseRates):
+    """ returns the shares of a stored amount that are released in the
+    periods after the storage period. The release rates of a LocalRelease are
+    applied one after the other, but never release more than the remainder
+    that was not released yet.
+
+    Parameters:
+    ----------------
+    releaseRates: list<float>
+        the release rates of a LocalRelease, starting with the immediate rate
+    """
+    remainder = 1 - releaseRates[0]
+    kernel = np.empty(max(len(releaseRates) - 1, 0))
+    for i in range(1, len(releaseRates)):
+        kernel[i-1] = min(releaseRates[i], remainder)
+        remainder = remainder - kernel[i-1]
+    return kernel
+
+
+def scheduleRelease(releaseList, runs, period, storedAmt, kernel):
+    """ adds the future releases of the amount stored in a period to the
+    release list, for a single run or for a block of runs at once
+
+    Parameters:
+    ----------------
+    releaseList: array<float>, shape (runs, periods)
+        the scheduled releases of a stock
+    runs: integer or slice
+        the run or the runs the amount was stored in
+    period: integer
+        the storage period
+    storedAmt: float or array<float>
+        the stored amount of every run
+    kernel: array<float>
+        the shares released in the following periods (futureReleaseKernel)
+    """
+    length = min(len(kernel), releaseList.shape[1] - period - 1)
+    if length > 0:
+        releaseList[runs, period + 1:period + 1 + length] += \
+            np.multiply.outer(storedAmt, kernel[:length])
+
+
+# names of the TC functions of PeriodDefinedTransfers that return the same
+# value in every run
+deterministicFunctions = ['fixedRate']
+
+
+def newRecord(runs, periods, recordDirectory = None):
+    """ returns a matrix of zeros to log a quantity for all runs and periods.
+    If a record directory is given, the matrix is backed by a memory mapped
+    file in this directory instead of the main memory; the simulator deletes
+    the files with their directory (see Simulator.deleteRecords).
+    """
+    if recordDirectory is None:
+        return np.zeros((runs, periods))
+    handle, fileName = tempfile.mkstemp(suffix='.dat', prefix='record_',
+                                        dir=recordDirectory)
+    os.close(handle)
+    return np.memmap(fileName, dtype=float, mode='w+', shape=(runs, periods))
+
+
+def randomStream(random):
+    """ returns the random stream of a component: the numpy Generator set by
+    the simulator or, if there is none, the global numpy random stream
+    """
+    return np.random if random is None else random
+
+
+def drawValues(function, parameters, runs = None, random = None):
+    """ draws a value (or an array of 'runs' values) of a sampling function
+    with the given parameters. If a numpy Generator 'random' is given, the
+    values of the sampling functions of the global numpy random stream and of
+    the registered distributions (see module distributions) are drawn from
+    it; other functions are called as they are.
+    """
+    if random is not None:
+        function = ds.streamFunction(function, random) or function
+    return function(*parameters, size=runs)
 
 
 
@@ -33,13 +186,13 @@ class Compartment(object):
     inits a matrix to log the material inflows for all simulation runs and
     periods
     """
-    def initFlowLog(self, runs, periods):
+    def initFlowLog(self, runs, periods, recordDirectory = None):
         """
         if flow record is set, a matrix is initialized to log all flows to the 
         compartment        
         """
         if self.logInflows:
-            self.inflowRecord = np.zeros((runs, periods))
+            self.inflowRecord = newRecord(runs, periods, recordDirectory)
     
     
     def logFlow(self, run, period, amt):    
@@ -79,19 +232,22 @@ class FlowCompartment(Compartment):
         self.logOutflows = logOutflows
         self.immediateReleaseRate = 1
     
-    def determineTCs(self, useGlobalTCsettings, globalSettingsAdjust, period):   
+    def determineTCs(self, useGlobalTCsettings, globalSettingsAdjust, period,
+                     runs = None):
         """
         Samples transfer from the underlying probability distribution, may \
         adjust to a sum of one over all outgoing transfers.
+        If a number of runs is given, the current TCs are arrays holding one \
+        value for each of these runs.
         """
 
         # modified by RoBa, October 2015: parameter 'period' in
         # sampleTC(period) is used for transfers of class 'PeriodDefinedTransfer'   
         for t in self.transfers:
             if isinstance(t, PeriodDefinedTransfer):
-                t.sampleTC(period)
+                t.sampleTC(period, runs)
             else:
-                t.sampleTC()
+                t.sampleTC(runs)
         
         if (not useGlobalTCsettings) & self.adjustOutTCs:
             self.adjustTCs()
@@ -100,25 +256,27 @@ class FlowCompartment(Compartment):
             self.adjustTCs()                
 
 
-    def initFlowLog(self, runs, periods):
+    def initFlowLog(self, runs, periods, recordDirectory = None):
         """
         if flow record is set, a matrix is initialized to log all flows to the 
         compartment
         if outFlows are logged a dictionary is initialized to log the outflows        
         """
         if self.logInflows:
-            self.inflowRecord = np.zeros((runs, periods))
+            self.inflowRecord = newRecord(runs, periods, recordDirectory)
             
         if self.logOutflows:
             self.outflowRecord = {}
             for t in self.transfers:
-                self.outflowRecord[t.target.name] = np.zeros((runs, periods))
+                self.outflowRecord[t.target.name] = newRecord(runs, periods,
+                                                              recordDirectory)
 
     # annotation RoBa, January 2016: never run
-    def initInventory(self, runs, periods):
-        self.inventory = np.zeros((runs, periods))
+    def initInventory(self, runs, periods, recordDirectory = None):
+        self.inventory = newRecord(runs, periods, recordDirectory)
         self.releaseList = np.zeros((runs, periods))
-        self.localRelease.releaseList = np.zeros((runs, periods))
+        self.localRelease.releaseList = newRecord(runs, periods,
+                                                  recordDirectory)
 
 
     def logFlow(self, run, period, amt):    
@@ -142,6 +300,22 @@ class FlowCompartment(Compartment):
         If that is insufficient (negativ TCs are not allowed), adjustment of \
         the TC with next higher priority and so on...
         """
+        if np.ndim(self.transfers[0].currentTC) == 0:
+            self.__adjustSingleRunTCs()
+            return
+
+        # TCs sampled for several runs at once are adjusted all together
+        runs = max(np.size(t.currentTC) for t in self.transfers)
+        adjustedTCs = adjustTCBlock(np.column_stack([np.broadcast_to(
+                          np.asarray(t.currentTC, dtype=float), (runs,)) for t
+                          in self.transfers]), 
+                          [t.priority for t in self.transfers])
+        for i in range(len(self.transfers)):
+            self.transfers[i].currentTC = adjustedTCs[:, i]
+
+
+    def __adjustSingleRunTCs(self):
+        """ Adjusts the scalar TCs of a single run, see adjustTCs."""
         tcSum = sum(t.currentTC for t in self.transfers)
         currentPriority = min(t.priority for t in self.transfers)
        
@@ -198,8 +372,8 @@ class Sink(Compartment):
     def __init__(self, name, logInflows = False, categories = []):
         super(Sink, self).__init__(name, logInflows, categories)
                         
-    def initInventory(self, runs, periods):
-        self.inventory = np.zeros((runs, periods))
+    def initInventory(self, runs, periods, recordDirectory = None):
+        self.inventory = newRecord(runs, periods, recordDirectory)
             
     def updateInventory(self, run, period):
         """ transfers the stored amount from the end of a period to the 
@@ -246,16 +420,17 @@ class Stock(FlowCompartment, Sink):
         self.categories = categories
 
     
-    def initInventory(self, runs, periods):
-        self.inventory = np.zeros((runs, periods))
+    def initInventory(self, runs, periods, recordDirectory = None):
+        self.inventory = newRecord(runs, periods, recordDirectory)
         self.releaseList = np.zeros((runs, periods))
         # annotation RoBa, December 2015: 'self.releaseList' is never used
-        self.localRelease.releaseList = np.zeros((runs, periods))      
+        self.localRelease.releaseList = newRecord(runs, periods,
+                                                  recordDirectory)      
         if self.logImmediateFlows:
             self.immediateFlowRecord = {}
             for t in self.transfers:
-                self.immediateFlowRecord[t.target.name] = np.zeros((runs, 
-                                                                    periods))
+                self.immediateFlowRecord[t.target.name] = newRecord(runs, 
+                                                      periods, recordDirectory)
         
         
     def updateImmediateReleaseRate(self):
@@ -350,21 +525,21 @@ class TDRStock(Stock):
         self.immediateReleaseRate = {}
 
     
-    def initInventory(self, runs, periods):
-        self.inventory = np.zeros((runs, periods))
+    def initInventory(self, runs, periods, recordDirectory = None):
+        self.inventory = newRecord(runs, periods, recordDirectory)
         self.releaseList = np.zeros((runs, periods))
         # annotation RoBa, November 2015: 'self.releaseList' is never used
         
         for locRel in self.localReleaseList:
             self.localRelease[locRel.target.name] = locRel
             self.localRelease[locRel.target.name].releaseList = \
-            np.zeros((runs, periods))
+            newRecord(runs, periods, recordDirectory)
         
         if self.logImmediateFlows:
             self.immediateFlowRecord = {}
             for t in self.transfers:
-                self.immediateFlowRecord[t.target.name] = np.zeros((runs, 
-                                                                    periods))
+                self.immediateFlowRecord[t.target.name] = newRecord(runs, 
+                                                      periods, recordDirectory)
                                                                     
                                                                             
     def updateImmediateReleaseRate(self):
@@ -436,23 +611,17 @@ class LocalRelease(object):
     """
     def __init__(self):  
         self.releaseList = 0
+        self.releaseKernel = None
 
 
     def getImmediateReleaseRate(self):
             return self.releaseRatesList[0]
             
     def scheduleFutureRelease(self, currentRun, currentPeriod, storedAmt):
-        remainder = 1- self.releaseRatesList[0]
-        per = currentPeriod + 1
-        i = 1     
-        while per < len(self.releaseList[currentRun]) and \
-        i < len(self.releaseRatesList):
-            self.releaseList[currentRun, per] = \
-            self.releaseList[currentRun, per] + \
-            storedAmt*min(self.releaseRatesList[i], remainder)
-            remainder = remainder - min(self.releaseRatesList[i], remainder)
-            i+=1
-            per+=1
+        if self.releaseKernel is None:
+            self.releaseKernel = futureReleaseKernel(self.releaseRatesList)
+        scheduleRelease(self.releaseList, currentRun, currentPeriod, storedAmt,
+                        self.releaseKernel)
 
  
  
@@ -564,55 +733,42 @@ class PeriodDefinedRelease(LocalRelease):
         the release's target Compartment
     releaseFunctionList: list<function> 
         for every period a function that returns the relative release rate
-        for a period    
+        for a period (or the release kernel, see releaseRates)
     delayList: list<Integer> 
         a delay time (in periods) for every period, befor the release starts.  
+    releaseKeys: list
+        for every period a key that identifies the release function and its \
+        delay in the kernel table (None for release functions that must not \
+        be shared, e.g. random ones)
+    kernelTable: components.ReleaseKernelTable
+        the table the release rates are interned into; if None, the release \
+        gets a table of its own
     """
         
-    def __init__(self, target, releaseFunctionList, delayList = []):
+    def __init__(self, target, releaseFunctionList, delayList = [],
+                 releaseKeys = None, kernelTable = None):
         super(PeriodDefinedRelease, self).__init__()
         self.target = target
         self.releaseFunctions = releaseFunctionList
         self.releaseRatesList = []
         self.delays = delayList
         self.releaseList = []
+        if kernelTable is None:
+            kernelTable = ReleaseKernelTable()
+        self.kernelTable = kernelTable
+        self.kernelIndices = []
+        if releaseKeys is None:
+            releaseKeys = [None] * len(self.releaseFunctions)
                 
         if len(self.releaseFunctions) == len(self.delays):
             self.numPeriods = len(self.delays)            
-            self.delayArrays = []
                         
             for p in range(self.numPeriods):
-                tempDelayArray = np.zeros((self.delays[p]))
-                self.delayArrays.append(tempDelayArray)
-                self.tempRatesArray = []
-                self.totRelease = 0
-                self.currentPeriod = 0
-                self.lastNonZero = 0
-                
-                                          # MAX period if no total release      
-                while self.totRelease < 1 and self.currentPeriod < 500:
-                    currentRelease = \
-                    self.releaseFunctions[p](self.currentPeriod)
-                    self.tempRatesArray.append(currentRelease)
-                    if currentRelease != 0:
-                        self.lastNonZero = self.currentPeriod
-                    self.totRelease += currentRelease
-                    self.currentPeriod +=1
-
-                if self.currentPeriod-1 != self.lastNonZero:
-                    self.tempRatesArray = \
-                    self.tempRatesArray[:self.lastNonZero+1]            
-        
-                if self.totRelease > 1: 
-                    self.tempRatesArray[-1] += 1-self.totRelease
-
-                if len(self.delayArrays[p]) != 0:
-                    tempArray = []
-                    tempArray.extend(self.delayArrays[p])
-                    tempArray.extend(self.tempRatesArray)
-                    self.releaseRatesList.append(tempArray)
-                else:
-                    self.releaseRatesList.append(self.tempRatesArray)
+                self.kernelIndices.append(self.kernelTable.intern(
+                    self.releaseFunctions[p], self.delays[p], releaseKeys[p]))
+                # the rates of the period only reference the table entry
+                self.releaseRatesList.append(
+                    self.kernelTable.kernels[self.kernelIndices[-1]])
 
         
     def getImmediateReleaseRate(self):
@@ -628,21 +784,88 @@ class PeriodDefinedRelease(LocalRelease):
 
     
     def scheduleFutureRelease(self, currentRun, currentPeriod, storedAmt):
-        remainder = 1 - self.releaseRatesList[currentPeriod][0]
-        per = currentPeriod + 1
-        i = 1     
-        while per < len(self.releaseList[currentRun]) and \
-        i < len(self.releaseRatesList[currentPeriod]):
-            self.releaseList[currentRun, per] = \
-            self.releaseList[currentRun, per] + \
-            storedAmt*min(self.releaseRatesList[currentPeriod][i], remainder)
-            remainder = \
-            remainder - min(self.releaseRatesList[currentPeriod][i], remainder)
-            i+=1
-            per+=1
+        scheduleRelease(self.releaseList, currentRun, currentPeriod, storedAmt,
+                        self.kernelTable.futureKernels[
+                            self.kernelIndices[currentPeriod]])
       
         
 
+class ReleaseKernelTable(object):
+    """ A table of release rate lists that several PeriodDefinedReleases share.
+    Release functions with the same key (e.g. the same function with the
+    same parameters and delay) are expanded to a rate list only once; the
+    releases keep the index of their entry for every period.
+    """
+    def __init__(self):
+        self.kernels = []  # release rates, starting with the immediate rate
+        self.futureKernels = []  # futureReleaseKernel of every entry
+        self.indices = {}  # Dict {key: index}
+
+
+    def intern(self, releaseFunction, delay, key = None):
+        """ returns the index of the rates of a release function with a
+        delay; a release function without key (e.g. a random one) always gets
+        an entry of its own
+        """
+        if key is not None and key in self.indices:
+            return self.indices[key]
+        rates = releaseRates(releaseFunction, delay)
+        self.kernels.append(rates)
+        self.futureKernels.append(futureReleaseKernel(rates))
+        if key is not None:
+            self.indices[key] = len(self.kernels) - 1
+        return len(self.kernels) - 1
+
+
+
+def releaseRates(releaseFunction, delay = 0):
+    """ returns the release rates of a release function for the periods after
+    the storage, starting with the immediate rate and preceded by delay
+    periods without release. The rates end with the period in which all 
+    material is released (or after 500 periods).
+
+    Parameters:
+    ----------------
+    releaseFunction: function or array<float>
+        function that returns the relative release rate for a period, or \
+        the rates of all periods at once (a release kernel, see \
+        lib.release_kernels)
+    delay: Integer 
+        delay time in periods, befor the release starts.
+    """
+    if callable(releaseFunction):
+        ratesList = []
+        totRelease = 0
+        currentPeriod = 0
+        lastNonZero = 0
+                                      # MAX period if no total release      
+        while totRelease < 1 and currentPeriod < 500:
+            currentRelease = releaseFunction(currentPeriod)
+            ratesList.append(currentRelease)
+            if currentRelease != 0:
+                lastNonZero = currentPeriod
+            totRelease += currentRelease
+            currentPeriod +=1
+    else:
+        rates = np.asarray(releaseFunction, dtype=float)[:500]
+        totals = np.cumsum(rates)
+        complete = np.flatnonzero(totals >= 1)
+        currentPeriod = complete[0] + 1 if len(complete) else len(rates)
+        nonZero = np.flatnonzero(rates[:currentPeriod])
+        lastNonZero = nonZero[-1] if len(nonZero) else 0
+        ratesList = list(rates[:currentPeriod])
+        totRelease = totals[currentPeriod-1]
+
+    if currentPeriod-1 != lastNonZero:
+        ratesList = ratesList[:lastNonZero+1]            
+
+    if totRelease > 1: 
+        ratesList[-1] += 1-totRelease
+
+    return list(np.zeros(delay)) + ratesList
+
+
+
 class Transfer(object):
     """ A transfer object determines the relative rate of a total material flow
     that is transfered from one Compartment to another. The priority denotes
@@ -655,10 +878,19 @@ class Transfer(object):
         self.target = target
         self.priority = priority
         self.currentTC = 0
-    def sampleTC(self):
+        # stable identifier of the link of the transfer, keys its random
+        # streams in the common random numbers mode (see module sampling)
+        self.linkId = None
+        # random stream (numpy Generator) set by the simulator; the global
+        # numpy random stream if None
+        self.random = None
+    def sampleTC(self, runs = None):
          print('To be implemented in Subclass')
     def getCurrentTC(self):
          return self.currentTC
+    def isFixed(self, period):
+         """ True, if the TC of the period is the same in every run """
+         return False
          
 
 class ConstTransfer(Transfer):
@@ -680,9 +912,14 @@ class ConstTransfer(Transfer):
         super(ConstTransfer, self).__init__(target, priority)
         self.value = value        
         self.currentTC = value     
-    def sampleTC(self):
+    def isFixed(self, period):
+        return True
+    def sampleTC(self, runs = None):
         """ assign the constant value as current TC """
-        self.currentTC = self.value
+        if runs is None:
+            self.currentTC = self.value
+        else:
+            self.currentTC = np.full(runs, self.value, dtype=float)
         
 
 class StochasticTransfer(Transfer):
@@ -707,11 +944,12 @@ class StochasticTransfer(Transfer):
         super(StochasticTransfer, self).__init__(target, priority)
         self.function = function 
         self.parameters = parameters
-    def sampleTC(self):
+    def sampleTC(self, runs = None):
         """ samples a random value from the probability distribution as current 
         TC
         """
-        self.currentTC = self.function(*self.parameters)
+        self.currentTC = drawValues(self.function, self.parameters, runs,
+                                    self.random)
 
 
 class RandomChoiceTransfer(Transfer):
@@ -731,9 +969,10 @@ class RandomChoiceTransfer(Transfer):
     def __init__(self, sample, target, priority=1):
         super(RandomChoiceTransfer, self).__init__(target, priority)
         self.sample = sample
-    def sampleTC(self):
+    def sampleTC(self, runs = None):
         """ Randomly assigns one value from the sample as current TC"""
-        self.currentTC = np.random.choice(self.sample)
+        self.currentTC = randomStream(self.random).choice(self.sample,
+                                                          size=runs)
   
               
 class AggregatedTransfer(Transfer):
@@ -763,15 +1002,27 @@ class AggregatedTransfer(Transfer):
         else:
             self.weights = [1]*len(singleTransfers)
         
-    def sampleTC(self):
+    def sampleTC(self, runs = None):
         #An array of the weights, cumulatively summed.
         cs = np.cumsum(self.weights)
         total = sum(self.weights)  
-        #Find the index of the first weight over a random value.
-        ind = sum(cs < np.random.uniform(0, total))
-        transfer = self.singleTransfers[ind]
-        transfer.sampleTC()
-        self.currentTC = transfer.getCurrentTC()
+        random = randomStream(self.random)
+        for transfer in self.singleTransfers:
+            transfer.random = self.random
+        if runs is None:
+            #Find the index of the first weight over a random value.
+            ind = sum(cs < random.uniform(0, total))
+            transfer = self.singleTransfers[ind]
+            transfer.sampleTC()
+            self.currentTC = transfer.getCurrentTC()
+        else:
+            inds = np.sum(cs < random.uniform(0, total, (runs, 1)), axis=1)
+            self.currentTC = np.empty(runs)
+            for ind in np.unique(inds):
+                selected = inds == ind
+                transfer = self.singleTransfers[ind]
+                transfer.sampleTC(int(np.sum(selected)))
+                self.currentTC[selected] = transfer.getCurrentTC()
 
 
 
@@ -808,8 +1059,15 @@ class PeriodDefinedTransfer(Transfer):
         self.functions = functionList
         self.parameters = parameterList
         self.priorities = priorityList
+        # TCs of the periods provided by a sampling design (see module sampling)
+        self.designTCs = {}
+
+    def isFixed(self, period):
+        return period < len(self.functions) and \
+               getattr(self.functions[period], '__name__', '') in \
+               deterministicFunctions
         
-    def sampleTC(self, period):
+    def sampleTC(self, period, runs = None):
         
         listLength = len(self.priorities)
         
@@ -817,18 +1075,17 @@ class PeriodDefinedTransfer(Transfer):
            listLength == len(self.parameters):
             if period < listLength:
                 self.priority = self.priorities[period]
-                tempList = []
-                x=0
-                # workaround for random choice function
-                while x < len(self.parameters[period]):
-                    tempList.append(x)
-                    x += 1
-                if self.functions[period] == np.random.choice:
-                    i = np.random.choice(tempList)
-                    self.currentTC = self.parameters[period][i]
+                if period in self.designTCs:
+                    self.currentTC = self.designTCs[period]
+                elif self.functions[period] == np.random.choice:
+                    # workaround for random choice function: draw the index
+                    i = randomStream(self.random).choice(
+                        len(self.parameters[period]), size=runs)
+                    self.currentTC = np.asarray(self.parameters[period])[i]
                 else:
-                    self.currentTC = \
-                    self.functions[period](*self.parameters[period])
+                    self.currentTC = drawValues(self.functions[period],
+                                                self.parameters[period], runs,
+                                                self.random)
                 
             else:
                 print('too many periods or too few transfers')
@@ -847,8 +1104,12 @@ class SinglePeriodInflow(object):
     """
     def __init__(self):
         self.currentValue = None
+        # value provided by a sampling design (see module sampling)
+        self.designValue = None
+        # random stream (numpy Generator), see Transfer
+        self.random = None
     
-    def sampleValue(self):
+    def sampleValue(self, runs = None):
         pass
     
     def getValue(self):
@@ -875,8 +1136,12 @@ class StochasticFunctionInflow(SinglePeriodInflow):
         self.pdf = probabilityDistribution
         self.parameterValues = parameters       
         
-    def sampleValue(self): 
-        self.currentValue = self.pdf(*self.parameterValues)
+    def sampleValue(self, runs = None): 
+        if self.designValue is not None:
+            self.currentValue = self.designValue
+        else:
+            self.currentValue = drawValues(self.pdf, self.parameterValues,
+                                           runs, self.random)
     
     
     
@@ -894,8 +1159,12 @@ class RandomChoiceInflow(SinglePeriodInflow):
         super(RandomChoiceInflow, self).__init__()
         self.sample = sample  
 
-    def sampleValue(self):
-        self.currentValue = np.random.choice(self.sample)
+    def sampleValue(self, runs = None):
+        if self.designValue is not None:
+            self.currentValue = self.designValue
+        else:
+            self.currentValue = randomStream(self.random).choice(self.sample,
+                                                                 size=runs)
         
         
     
@@ -929,6 +1198,13 @@ class ExternalInflow(object):
         self.derivationDistribution = derivationDistribution
         self.derivationParameters = derivationParameters
         self.derivationFactor = 1
+        # derivation factor provided by a sampling design (see module 
+        # sampling)
+        self.designValue = None
+        # stable identifier of the link of the inflow (see Transfer)
+        self.linkId = None
+        # random stream (numpy Generator), see Transfer
+        self.random = None
         
     def getCurrentInflow(self, period):  
         pass
@@ -982,20 +1258,23 @@ class ExternalListInflow(ExternalInflow):
                 returnValue = \
                 self.inflowList[(period-self.startDelay)].getValue()*\
                 self.derivationFactor                
-                if returnValue >=0:
-                    return returnValue
-                else: 
-                    return 0               
+                # negative inflows are cut off (for every run if sampled
+                # for several runs at once)
+                return np.maximum(returnValue, 0)
             else:
                 return 0
 
 
-    def sampleValues(self):
+    def sampleValues(self, runs = None):
         for inf in self.inflowList:
-            inf.sampleValue()
-        if self.derivationDistribution != None: 
-            self.derivationFactor = \
-            self.derivationDistribution(*self.derivationParameters)
+            inf.random = self.random
+            inf.sampleValue(runs)
+        if self.designValue is not None:
+            self.derivationFactor = self.designValue
+        elif self.derivationDistribution != None: 
+            self.derivationFactor = drawValues(self.derivationDistribution,
+                                               self.derivationParameters, runs,
+                                               self.random)
 
 
 class ExternalFunctionInflow(ExternalInflow):
@@ -1052,17 +1331,18 @@ class ExternalFunctionInflow(ExternalInflow):
                             period-self.startDelay)*self.derivationFactor
             print(self.inflowFunction(self.baseValue,period-self.startDelay))
             print(self.derivationFactor)
-            if returnValue >= 0:
-                return returnValue
-            else:
-                return 0
+            return np.maximum(returnValue, 0)
     
-    def sampleValues(self):    
-        self.basicInflow.sampleValue()
+    def sampleValues(self, runs = None):    
+        self.basicInflow.random = self.random
+        self.basicInflow.sampleValue(runs)
         self.baseValue = self.basicInflow.getValue()
-        if self.derivationDistribution != None:  
-            self.derivationFactor = \
-            self.derivationDistribution(*self.derivationParameters)
+        if self.designValue is not None:
+            self.derivationFactor = self.designValue
+        elif self.derivationDistribution != None:  
+            self.derivationFactor = drawValues(self.derivationDistribution,
+                                               self.derivationParameters, runs,
+                                               self.random)
 
 
     def defaultInflowFunction(self, base, period):
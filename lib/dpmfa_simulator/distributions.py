@@ -0,0 +1,245 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+"""
+Created in October 2026
+
+The distributions module contains the registry of the probability
+distributions of the uncertain inflows and transfer coefficients ('stoch'
+values of a source file). The importer validates the parameters and the
+linker looks up the sampling functions of the components here, the sampling
+designs use the inverse distribution functions.
+
+Every distribution has an entry in 'distributions' under the name of its
+sampling function:
+
+    normal       (loc, scale)
+    uniform      (low, high)
+    triangular   (left, mode, right)
+    lognormal    (s, scale[, loc]): loc + scale * exp(s * N(0, 1)), like the
+                 lognormal release function
+    beta         (a, b[, low, high]): beta distribution on [low, high]
+                 (default [0, 1])
+    truncnormal  (loc, scale, low, high): normal distribution truncated to
+                 [low, high]
+    pert         (minimum, mode, maximum): beta-PERT distribution
+
+The bounded distributions are convenient for transfer coefficients, whose
+normalization (see components.FlowCompartment.adjustTCs) then has less to
+correct than for normal distributions.
+"""
+
+import functools
+import numpy as np
+import scipy.special as sp
+
+
+def normal(loc, scale, size = None, random = np.random):
+    return random.normal(loc, scale, size)
+
+
+def uniform(low, high, size = None, random = np.random):
+    return random.uniform(low, high, size)
+
+
+def triangular(left, mode, right, size = None, random = np.random):
+    return random.triangular(left, mode, right, size)
+
+
+def lognormal(s, scale, loc = 0., size = None, random = np.random):
+    return loc + scale * np.exp(s * random.standard_normal(size))
+
+
+def beta(a, b, low = 0., high = 1., size = None, random = np.random):
+    return low + (high - low) * random.beta(a, b, size)
+
+
+def truncnormal(loc, scale, low, high, size = None, random = np.random):
+    return inverseTruncnormal(random.random(size), loc, scale, low, high)
+
+
+def pert(minimum, mode, maximum, size = None, random = np.random):
+    a, b = pertShapes(minimum, mode, maximum)
+    return minimum + (maximum - minimum) * random.beta(a, b, size)
+
+
+def pertShapes(minimum, mode, maximum):
+    """ returns the shape parameters of the beta distribution of a PERT
+    distribution
+    """
+    width = float(maximum - minimum)
+    return 1 + 4 * (mode - minimum) / width, 1 + 4 * (maximum - mode) / width
+
+
+def inverseNormal(u, loc = 0., scale = 1.):
+    return loc + scale * sp.ndtri(u)
+
+
+def inverseUniform(u, low = 0., high = 1.):
+    return low + (high - low) * u
+
+
+def inverseTriangular(u, left, mode, right):
+    width = right - left
+    if width == 0:
+        return np.full(np.shape(u), float(left))
+    modeQuantile = (mode - left) / float(width)
+    return np.where(u < modeQuantile,
+                    left + np.sqrt(u * width * (mode - left)),
+                    right - np.sqrt((1 - u) * width * (right - mode)))
+
+
+def inverseLognormal(u, s, scale, loc = 0.):
+    return loc + scale * np.exp(s * sp.ndtri(u))
+
+
+def inverseBeta(u, a, b, low = 0., high = 1.):
+    return low + (high - low) * sp.betaincinv(a, b, u)
+
+
+def inverseTruncnormal(u, loc, scale, low, high):
+    lower = (low - loc) / float(scale)
+    upper = (high - loc) / float(scale)
+    if lower > 0:
+        # in the upper tail, the mirrored lower tail is more precise
+        first, last = sp.ndtr(-upper), sp.ndtr(-lower)
+        values = loc - scale * sp.ndtri(last - u * (last - first))
+    else:
+        first, last = sp.ndtr(lower), sp.ndtr(upper)
+        values = loc + scale * sp.ndtri(first + u * (last - first))
+    return np.clip(values, low, high)
+
+
+def inversePert(u, minimum, mode, maximum):
+    a, b = pertShapes(minimum, mode, maximum)
+    return minimum + (maximum - minimum) * sp.betaincinv(a, b, u)
+
+
+def checkNormal(loc, scale):
+    if scale < 0:
+        raise ValueError("The scale must not be negative.")
+
+
+def checkTriangular(left, mode, right):
+    if not left <= mode <= right or left == right:
+        raise ValueError("The mode must lie between the left and the right " +
+                         "bound, and the bounds must differ.")
+
+
+def checkLognormal(s, scale, loc = 0.):
+    if s < 0 or scale <= 0:
+        raise ValueError("The shape must not be negative and the scale " +
+                         "must be positive.")
+
+
+def checkBeta(a, b, low = 0., high = 1.):
+    if a <= 0 or b <= 0:
+        raise ValueError("The shapes a and b must be positive.")
+    if low >= high:
+        raise ValueError("The lower bound must be below the upper bound.")
+
+
+def checkTruncnormal(loc, scale, low, high):
+    if scale <= 0:
+        raise ValueError("The scale must be positive.")
+    if low >= high:
+        raise ValueError("The lower bound must be below the upper bound.")
+
+
+def checkPert(minimum, mode, maximum):
+    if not minimum <= mode <= maximum or minimum == maximum:
+        raise ValueError("The mode must lie between the minimum and the " +
+                         "maximum, and the minimum and maximum must differ.")
+
+
+
+class Distribution(object):
+    """ An entry of the registry of the distributions.
+
+    Parameters:
+    ----------------
+    sample: function
+        sampling function sample(*parameters, size=None, random=np.random) \
+        that returns a value or an array of 'size' values drawn from the \
+        random stream 'random' (numpy.random or a numpy Generator)
+    inverse: function
+        inverse distribution function inverse(u, *parameters) of an array \
+        of uniform numbers u
+    check: function
+        check(*parameters) raises a ValueError for invalid parameters (None \
+        if all parameters are valid)
+    fewest, most: integer
+        the numbers of parameters the distribution accepts
+    valueParameters: list<integer>
+        the positions of the parameters in the unit of the values (e.g. \
+        locations and bounds), which are checked like the values of fixed \
+        inflows and transfer coefficients; the others are shape parameters
+    example: string
+        example parameters for the messages of the importer
+    """
+    def __init__(self, sample, inverse, check, fewest, most, valueParameters,
+                 example):
+        self.sample = sample
+        self.inverse = inverse
+        self.check = check
+        self.fewest = fewest
+        self.most = most
+        self.valueParameters = valueParameters
+        self.example = example
+
+
+
+# the distributions by the names of their sampling functions
+distributions = {
+    'normal': Distribution(normal, inverseNormal, checkNormal, 2, 2,
+                           [0, 1], '0.5, 0.15'),
+    'uniform': Distribution(uniform, inverseUniform, None, 2, 2,
+                            [0, 1], '0.4, 0.6'),
+    'triangular': Distribution(triangular, inverseTriangular,
+                               checkTriangular, 3, 3, [0, 1, 2],
+                               '0.4, 0.5, 0.6'),
+    'lognormal': Distribution(lognormal, inverseLognormal, checkLognormal,
+                              2, 3, [1, 2], '0.25, 0.5'),
+    'beta': Distribution(beta, inverseBeta, checkBeta, 2, 4, [2, 3],
+                         '5, 5, 0.4, 0.6'),
+    'truncnormal': Distribution(truncnormal, inverseTruncnormal,
+                                checkTruncnormal, 4, 4, [0, 1, 2, 3],
+                                '0.5, 0.15, 0.2, 0.8'),
+    'pert': Distribution(pert, inversePert, checkPert, 3, 3, [0, 1, 2],
+                         '0.4, 0.5, 0.6')}
+
+
+def checkParameters(name, parameters):
+    """ raises a ValueError, if the parameters do not fit the distribution
+    with the given name
+    """
+    distribution = distributions[name]
+    if not distribution.fewest <= len(parameters) <= distribution.most:
+        if distribution.fewest == distribution.most:
+            number = "%d" % distribution.fewest
+        else:
+            number = "%d to %d" % (distribution.fewest, distribution.most)
+        raise ValueError("Please choose %s floats as parameters, got %d."
+                         % (number, len(parameters)))
+    if distribution.check is not None:
+        distribution.check(*parameters)
+
+
+def isDistribution(function):
+    """ True, if the function is the sampling function of a registered
+    distribution
+    """
+    name = getattr(function, '__name__', None)
+    return name in distributions and distributions[name].sample is function
+
+
+def streamFunction(function, stream):
+    """ returns the sampling function that draws the values of a sampling
+    function of the global numpy random stream or of a registered
+    distribution from a numpy Generator (e.g. stream.normal for
+    numpy.random.normal), None if there is none
+    """
+    if isDistribution(function):
+        return functools.partial(function, random=stream)
+    if getattr(function, '__self__', None) is np.random.mtrand._rand:
+        return getattr(stream, function.__name__, None)
+    return None
@@ -15,7 +15,6 @@ uncertainty about it.
 """
 
 from . import components as cp
-import numpy.random as nr
 
 
 class Model(object):
@@ -47,8 +46,10 @@ class Model(object):
     def __init__(self, name, compartments=[], inflows=[]):
         self.name = name
 
+        self.compartmentIndices = {}  # Dict {Compartment.name: index}
         if all(isinstance(comp, cp.Compartment) for comp in compartments):
             self.compartments = compartments
+            self.__indexCompartments()
         else:
             print('invalid compartment list!')
 
@@ -72,6 +73,7 @@ class Model(object):
         """
         if all(isinstance(comp, cp.Compartment) for comp in compartmentList):
             self.compartments = compartmentList
+            self.__indexCompartments()
         else:
             print('invalid compartment list!')
 
@@ -86,6 +88,29 @@ class Model(object):
         """
         if(isinstance(compartment, cp.Compartment)):
             self.compartments.append(compartment)
+            self.compartmentIndices.setdefault(compartment.name,
+                                               len(self.compartments) - 1)
+
+    def getCompartment(self, compartmentName):
+        """
+        Returns the compartment with the given name (None, if the model has
+        no such compartment)
+
+        Parameters:
+        ----------------
+        compartmentName: string
+            name of the compartment
+        """
+        index = self.compartmentIndices.get(compartmentName)
+        if index is None:
+            return None
+        return self.compartments[index]
+
+    def __indexCompartments(self):
+        # the first compartment of a name is found, like in a linear search
+        self.compartmentIndices = {}
+        for i in reversed(range(len(self.compartments))):
+            self.compartmentIndices[self.compartments[i].name] = i
 
     def setInflows(self, inflowList):
         """
@@ -142,7 +167,9 @@ class Model(object):
 
     def setSeed(self, seed):
         """
-        sets common seed value for all probability distributions of the Model
+        sets common seed value for all probability distributions of the Model;
+        the simulator draws the random values from streams seeded with it
+        instead of the global numpy random stream
 
         Parameter:
         ----------------
@@ -150,7 +177,6 @@ class Model(object):
             the seed value
         """
         self.seed = seed
-        nr.seed(seed)
 
 
 
@@ -168,8 +194,7 @@ class Model(object):
             transfer to be added
         """
         if((isinstance(transfer, cp.Transfer))):
-            compartment = next((comp for comp in self.compartments if 
-                                comp.name == compartmentName), None)
+            compartment = self.getCompartment(compartmentName)
             compartment.transfers.append(transfer)
         else:
             print('not a transfer')
@@ -188,8 +213,7 @@ class Model(object):
             the release strategy
 
         """
-        stock = next((comp for comp in self.compartments if 
-                      comp.name == stockName), None)
+        stock = self.getCompartment(stockName)
         if (stock != None):
             stock.releaseStrategy = releaseStrategy
         else:
@@ -210,8 +234,7 @@ class Model(object):
             inflow, ordered by period
         """
         
-        stock = next((comp for comp in self.compartments if
-                      comp.name == stockName), None)
+        stock = self.getCompartment(stockName)
         if (stock != None):
             stock.releaseStrategies = releaseStrategies
         else:
@@ -0,0 +1,359 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+"""
+Created in October 2026
+
+The sampling module contains sampling designs for the uncertain inputs of a
+model. Instead of drawing every input independently at random, a design
+generates stratified (Latin hypercube) or quasi-random (scrambled Sobol)
+points over all uncertain inputs of a model at once and maps them through
+the inverse cumulative distribution functions of the input distributions.
+
+The BlockSampler draws the inputs at random like the components themselves,
+but for a block of runs at once and from an independent random stream per
+input and block, so the values of a run do not depend on how and where the
+runs are evaluated.
+"""
+
+import hashlib
+import warnings
+import numpy as np
+from scipy.stats import qmc
+from . import components as cp
+from . import distributions as ds
+
+
+def inverseChoice(u, sample):
+    sample = np.asarray(sample)
+    return sample[np.minimum((u * len(sample)).astype(int), len(sample) - 1)]
+
+
+# inverse cumulative distribution functions of the sampling functions of the
+# components, by sampling function: the registered distributions (see
+# distributions.distributions) and the functions of numpy.random with the
+# same parameters. Functions are not matched by name, numpy.random.lognormal
+# e.g. has other parameters than distributions.lognormal.
+inverseFunctions = {np.random.normal: ds.inverseNormal,
+                    np.random.uniform: ds.inverseUniform,
+                    np.random.triangular: ds.inverseTriangular,
+                    np.random.choice: inverseChoice}
+inverseFunctions.update({ds.distributions[name].sample:
+                         ds.distributions[name].inverse for name in
+                         ds.distributions})
+
+designs = ['random', 'lhs', 'sobol', 'antithetic']
+
+
+
+class SamplingDesign(object):
+    """ Generates the values of all uncertain inputs of a model from a Latin
+    hypercube or a scrambled Sobol design. The design is drawn once over all
+    runs; blocks of runs (chunks, batches or the shards of the workers) take
+    their rows of it, so the values of a run do not depend on how and where
+    the runs are evaluated.
+
+    Every stochastic period of a PeriodDefinedTransfer and every
+    StochasticFunctionInflow and RandomChoiceInflow is one dimension of the
+    design, as long as its distribution has an inverse in inverseFunctions;
+    all other inputs keep being sampled at random.
+
+    Parameters:
+    ----------------
+    method: string
+        'lhs' for Latin hypercube sampling, 'sobol' for a scrambled Sobol \
+        sequence
+    inflows: list<components.ExternalListInflow>
+        the external inflows of the model
+    transfers: list<components.Transfer>
+        all transfers of the model
+    periods: integer
+        the number of simulated periods
+    runs: integer
+        the number of runs of the design
+    seed: integer
+        the seed of the random stream of the design
+    """
+    def __init__(self, method, inflows, transfers, periods, runs,
+                 seed = None):
+        self.method = method
+        self.inputs = []  # (input, period, inverse function, parameters)
+
+        for inflow in inflows:
+            for single in getattr(inflow, 'inflowList', []):
+                if isinstance(single, cp.StochasticFunctionInflow) and \
+                   single.pdf in inverseFunctions:
+                    self.inputs.append((single, None, inverseFunctions[
+                                        single.pdf], single.parameterValues))
+                elif isinstance(single, cp.RandomChoiceInflow):
+                    self.inputs.append((single, None, inverseChoice,
+                                        [single.sample]))
+            if inflow.derivationDistribution in inverseFunctions:
+                self.inputs.append((inflow, None, inverseFunctions[
+                                    inflow.derivationDistribution],
+                                    inflow.derivationParameters))
+
+        for trans in transfers:
+            if not isinstance(trans, cp.PeriodDefinedTransfer):
+                continue
+            for period in range(min(periods, len(trans.functions))):
+                function = trans.functions[period]
+                if function == np.random.choice:
+                    self.inputs.append((trans, period, inverseChoice,
+                                        [trans.parameters[period]]))
+                elif function in inverseFunctions:
+                    self.inputs.append((trans, period, inverseFunctions[
+                                        function], trans.parameters[period]))
+
+        if self.method == 'sobol' and len(self.inputs) > qmc.Sobol.MAXDIM:
+            print('too many uncertain inputs for a Sobol design (%d), '
+                  % len(self.inputs) + 'using a Latin hypercube design')
+            self.method = 'lhs'
+
+        # the points of the design in the unit cube, shape (runs, inputs)
+        randomState = np.random.default_rng(seed)
+        if self.method == 'sobol' and len(self.inputs):
+            sobol = qmc.Sobol(len(self.inputs), scramble=True,
+                              seed=randomState)
+            with warnings.catch_warnings():
+                # the balance of the points is only perfect for numbers of
+                # runs that are a power of two
+                warnings.simplefilter('ignore')
+                self.points = sobol.random(runs)
+        else:
+            self.points = np.empty((runs, len(self.inputs)))
+            for dim in range(len(self.inputs)):
+                self.points[:, dim] = (randomState.permutation(runs) +
+                                       randomState.random(runs)) / runs
+        np.clip(self.points, 1e-12, 1 - 1e-12, out=self.points)
+
+
+    def sample(self, runs, firstRun = 0):
+        """ assigns the values of the design of the runs firstRun to
+        firstRun+runs-1 to the inputs (used by the vectorized engine)
+        """
+        points = self.points[firstRun:firstRun + runs]
+        self.values = []
+        for dim in range(len(self.inputs)):
+            component, period, inverse, parameters = self.inputs[dim]
+            self.values.append(inverse(points[:, dim], *parameters))
+        self.__assign(slice(None))
+
+
+    def select(self, run):
+        """ assigns the values of a single run of the last sampled block to
+        the inputs (used by the loop engine)
+        """
+        self.__assign(run)
+
+
+    def __assign(self, runs):
+        for (component, period, inverse, parameters), values in \
+        zip(self.inputs, self.values):
+            if period is None:
+                component.designValue = values[runs]
+            else:
+                component.designTCs[period] = values[runs]
+
+
+
+def linkStreamKey(linkId, kind, number):
+    """ returns the spawn key of the random streams of an input (without the
+    block number) from the identifier of its link, its kind ('inflow',
+    'derivation' or 'transfer') and its period. The key does not depend on
+    the other links of the model, so variants of a model that share a link
+    draw the same random numbers for it.
+    """
+    digest = hashlib.sha256(('%s\n%s\n%d' % (linkId, kind, number)).encode())
+    words = np.frombuffer(digest.digest()[:16], dtype='<u4')
+    # distinct from the keys (input number, block) of the inputs without a
+    # link identifier
+    return (2**32,) + tuple(int(word) for word in words)
+
+
+def clearDesignValues(inflows, transfers):
+    """ removes the values assigned by a design or a sampler from the inputs,
+    so they are sampled at random again
+    """
+    for inflow in inflows:
+        inflow.designValue = None
+        for single in getattr(inflow, 'inflowList', []):
+            if isinstance(single, cp.SinglePeriodInflow):
+                single.designValue = None
+    for trans in transfers:
+        if isinstance(trans, cp.PeriodDefinedTransfer):
+            trans.designTCs = {}
+
+
+
+class BlockSampler(object):
+    """ Draws the values of all stochastic inputs of a model at random, from
+    an independent random stream per input and block of runs.
+
+    The runs are divided into blocks of blockSize runs. The values of an
+    input for a block are drawn with one call from a numpy Generator (Philox)
+    seeded with SeedSequence(seed, spawn_key=(input number, block number)).
+    The values of a run therefore only depend on the seed, the input and the
+    number of the run: they are the same for both engines, any batch or chunk
+    size and any number of workers, and the inputs can be sampled in any
+    order.
+    With antithetic sampling, the runs are paired: the values of an input
+    for the even runs are drawn from uniform numbers u through the inverse
+    of its distribution function (see inverseFunctions), the ones of the
+    following odd runs from the complementary numbers 1 - u. As the pairs
+    are given by the run numbers, they are never split by batches, chunks
+    or shards.
+    The inputs are the stochastic periods of the PeriodDefinedTransfers, the
+    StochasticFunctionInflows and RandomChoiceInflows and the derivation
+    factors of the external inflows whose sampling functions are the ones
+    of numpy.random or of the registered distributions (see module
+    distributions); all other inputs keep being sampled from the global
+    random stream when they are used. Inputs without an inverse distribution
+    function are not mirrored.
+    In the common random numbers mode, the streams of an input are keyed by
+    the identifier of its link (see components.Transfer.linkId), its kind and
+    its period instead of its number. Variants of a model, e.g. scenarios of
+    a recycling rate, then draw the same random numbers for all the links
+    they share, which makes the differences of their results less noisy.
+
+    Parameters:
+    ----------------
+    inflows: list<components.ExternalListInflow>
+        the external inflows of the model
+    transfers: list<components.Transfer>
+        all transfers of the model
+    periods: integer
+        the number of simulated periods
+    seed: integer
+        the seed of the streams
+    antithetic: boolean
+        if True, the runs are paired with mirrored runs
+    commonRandomNumbers: boolean
+        if True, the streams are keyed by the links of the inputs
+    """
+    blockSize = 256
+
+    def __init__(self, inflows, transfers, periods, seed, antithetic = False,
+                 commonRandomNumbers = False):
+        self.seed = seed
+        self.antithetic = antithetic
+        self.inputs = []  # (input, period, sampling function, parameters)
+        # the link, the kind and the number of every input, the key of its
+        # streams in the common random numbers mode
+        inputKeys = []
+
+        for inflow in inflows:
+            for number, single in enumerate(getattr(inflow, 'inflowList', [])):
+                if isinstance(single, cp.StochasticFunctionInflow):
+                    self.inputs.append((single, None, single.pdf,
+                                        single.parameterValues))
+                elif isinstance(single, cp.RandomChoiceInflow):
+                    self.inputs.append((single, None, np.random.choice,
+                                        [single.sample]))
+                else:
+                    continue
+                inputKeys.append((inflow.linkId, 'inflow', number))
+            if inflow.derivationDistribution is not None:
+                self.inputs.append((inflow, None,
+                                    inflow.derivationDistribution,
+                                    inflow.derivationParameters))
+                inputKeys.append((inflow.linkId, 'derivation', 0))
+
+        for trans in transfers:
+            if not isinstance(trans, cp.PeriodDefinedTransfer):
+                continue
+            for period in range(min(periods, len(trans.functions))):
+                if trans.isFixed(period):
+                    continue
+                if trans.functions[period] == np.random.choice:
+                    self.inputs.append((trans, period, np.random.choice,
+                                        [trans.parameters[period]]))
+                else:
+                    self.inputs.append((trans, period, 
+                                        trans.functions[period],
+                                        trans.parameters[period]))
+                inputKeys.append((trans.linkId, 'transfer', period))
+
+        used = [ds.streamFunction(entry[2], np.random.Generator) is not None
+                for entry in self.inputs]
+        self.inputs = [entry for entry, use in zip(self.inputs, used) if use]
+        inputKeys = [key for key, use in zip(inputKeys, used) if use]
+        # the spawn keys of the streams of the inputs, without the block
+        self.streamKeys = [(inputNumber,) for inputNumber in 
+                           range(len(self.inputs))]
+        if commonRandomNumbers:
+            missing = sum(key[0] is None for key in inputKeys)
+            if missing:
+                print('%d random inputs without a link identifier do not use '
+                      % missing + 'common random numbers')
+            self.streamKeys = [self.streamKeys[i] if key[0] is None else
+                               linkStreamKey(*key) for i, key in 
+                               enumerate(inputKeys)]
+        self.blockValues = {}  # {input number: (block number, values)}
+
+
+    def sample(self, runs, firstRun = 0):
+        """ assigns the values of all inputs for the runs firstRun to
+        firstRun+runs-1 (used by the vectorized engine)
+        """
+        self.values = [self.__runValues(i, firstRun, runs) for i in
+                       range(len(self.inputs))]
+        self.runValues = None
+        for (component, period, function, parameters), values in \
+        zip(self.inputs, self.values):
+            if period is None:
+                component.designValue = values
+            else:
+                component.designTCs[period] = values
+
+
+    def select(self, run):
+        """ assigns the values of a single run of the last sampled runs to
+        the inputs (used by the loop engine)
+        """
+        if self.runValues is None:
+            # python numbers, which the loop engine uses faster than numpy
+            # scalars
+            self.runValues = [values.tolist() for values in self.values]
+        for (component, period, function, parameters), values in \
+        zip(self.inputs, self.runValues):
+            if period is None:
+                component.designValue = values[run]
+            else:
+                component.designTCs[period] = values[run]
+
+
+    def __runValues(self, inputNumber, firstRun, runs):
+        """ returns the values of an input for the runs firstRun to
+        firstRun+runs-1, drawn block by block
+        """
+        firstBlock = firstRun // self.blockSize
+        lastBlock = (firstRun + runs - 1) // self.blockSize
+        blocks = []
+        for block in range(firstBlock, lastBlock + 1):
+            cached = self.blockValues.get(inputNumber)
+            if cached is None or cached[0] != block:
+                cached = (block, self.__draw(inputNumber, block))
+                self.blockValues[inputNumber] = cached
+            blocks.append(cached[1])
+        offset = firstRun - firstBlock * self.blockSize
+        return np.concatenate(blocks)[offset:offset + runs]
+
+
+    def __draw(self, inputNumber, block):
+        """ draws the values of an input for a block of runs from the stream
+        of the input and the block
+        """
+        stream = np.random.Generator(np.random.Philox(np.random.SeedSequence(
+                 self.seed, spawn_key=self.streamKeys[inputNumber] + 
+                 (block,))))
+        component, period, function, parameters = self.inputs[inputNumber]
+        if self.antithetic and function in inverseFunctions:
+            u = np.clip(stream.random(self.blockSize // 2), 1e-12, 1 - 1e-12)
+            return np.asarray(inverseFunctions[function](np.column_stack(
+                   (u, 1 - u)).ravel(), *parameters), dtype=float)
+        if function == np.random.choice:
+            # the index of the value is drawn, like by the components
+            sample = np.asarray(parameters[0])
+            return sample[stream.choice(len(sample), size=self.blockSize)]
+        return np.asarray(ds.streamFunction(function, stream)(*parameters,
+                          size=self.blockSize), dtype=float)
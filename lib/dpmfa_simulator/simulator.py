@@ -11,9 +11,16 @@ Dynamic Probabilistic Material Flow Model.
 """
 
 
+import os
+import copy
+import shutil
+import tempfile
+import multiprocessing as mp
 import numpy as np
-import numpy.linalg as la
 from . import components as cp
+from . import solver as sv
+from . import accumulators as ac
+from . import sampling as sa
 
 
 class Simulator(object):
@@ -37,23 +44,147 @@ class Simulator(object):
         defines, if outgoing TCs from Model Compartments and Stocks are \
         adjusted to sum up to one. This Parameter is only considered, if the \
         global parameter for normalization is used.
+    engine: string
+        'loop' evaluates the model run by run. 'vectorized' evaluates a \
+        batch of runs at once: all TCs and inflows of the batch are sampled \
+        together and the flow systems of all runs of a period are solved \
+        with one call of the linear solver. Models without stocks are \
+        sampled period by period, but the flow systems of all periods of a \
+        batch are solved together.
+    batchSize: integer
+        the number of runs evaluated together by the vectorized engine. If \
+        not defined, it is chosen to keep the stacked flow matrices of a \
+        batch at about 64 MB.
+    solver: string
+        the backend used to solve the flow system of a period. 'dense' \
+        factorizes the whole flow matrix, 'scc' substitutes along the \
+        topological order of the model graph and only factorizes the blocks \
+        of its recycling loops. 'iterative' substitutes like 'scc', but \
+        iterates the recycling loops with Gauss-Seidel sweeps that start \
+        from the solution of the previous period or run. 'sparse' \
+        assembles only the non-zero entries of the flow matrix and \
+        factorizes it with a sparse LU factorization, for models of \
+        thousands of compartments.
+    solverTolerance: float
+        the relative precision up to which the 'iterative' solver iterates \
+        the recycling loops (default: 1e-12)
+    solverBlockSize: integer
+        the number of compartments from which on the 'iterative' solver \
+        iterates a recycling loop; smaller loops are factorized (default: \
+        solver.IterativeSolver.minBlockSize). With a looser solverTolerance, \
+        iterating pays off already for smaller loops.
+    workers: integer
+        the number of processes the runs are distributed over. The runs are \
+        split into one shard per worker. The random inputs are drawn from \
+        streams per input and run (see sampling.BlockSampler) or from one \
+        design over all runs (see sampling.SamplingDesign), so the \
+        results do not depend on the number of workers; all other random \
+        values (e.g. random choices from samples) are drawn from a stream per \
+        shard, seeded with (seed, shard number).
+    recordDirectory: string
+        if defined, the records of all runs (inflows, outflows, inventories \
+        and scheduled releases) are stored in memory mapped files in this \
+        directory instead of the main memory, so the number of runs is not \
+        limited by the available memory. The files of a simulation are kept \
+        in a subdirectory of their own, which deleteRecords removes once \
+        the results are exported.
+    streaming: boolean
+        if True, the runs are evaluated in chunks and the records of every \
+        chunk are folded into online statistics (components of the module \
+        accumulators) that replace the records after the simulation. The \
+        memory needed per record is then independent of the number of runs, \
+        but only means, variances and estimated percentiles are available.
+    chunkSize: integer
+        the number of runs per chunk in the streaming and the adaptive mode \
+        (default: 1000, 250 in the adaptive mode)
+    tolerance: float
+        if defined, the number of runs is chosen adaptively: the runs are \
+        evaluated in chunks until the standard errors of the means and of \
+        the tracked percentiles of all logged outflows and inventories are \
+        smaller than tolerance times the estimates. 'runs' is then the \
+        maximum number of runs. After the simulation, numRuns holds the \
+        number of evaluated runs and precision the achieved relative \
+        standard error.
+    trackedPercentiles: list<float>
+        the percentiles (0 - 100) whose precision is checked in the \
+        adaptive mode besides the means
+    sampling: string
+        'random' draws all uncertain inputs independently at random, from \
+        a stream per input and block of runs (see sampling.BlockSampler). \
+        'lhs' \
+        and 'sobol' draw them from a Latin hypercube or a scrambled Sobol \
+        design over all uncertain inputs of the model (see module sampling). \
+        'antithetic' draws them like 'random', but pairs every run with a \
+        run from the mirrored values of the inputs; the number of runs is \
+        then rounded up to an even number.
+    commonRandomNumbers: boolean
+        if True, the random streams of the inputs are keyed by their links \
+        instead of their order in the model, so variants of a model draw \
+        the same random numbers for the links they share (random and \
+        antithetic sampling only, see sampling.BlockSampler)
 
     """
 
+    engines = ['loop', 'vectorized']
+    # the records of a compartment that are merged back from the shards
+    recordNames = ['inflowRecord', 'outflowRecord', 'inventory',
+                   'immediateFlowRecord']
+
     def __init__(self, runs, periods, seed = None, useGlobalTCSettings = True,
-                 normalizeTCs = True):
+                 normalizeTCs = True, engine = 'loop', batchSize = None,
+                 solver = 'dense', workers = 1, recordDirectory = None,
+                 streaming = False, chunkSize = None, tolerance = None,
+                 trackedPercentiles = [], sampling = 'random',
+                 solverTolerance = None, commonRandomNumbers = False,
+                 solverBlockSize = None):
+        if engine not in self.engines:
+            raise ValueError("unknown simulation engine '%s', use one of %s"
+                             % (engine, self.engines))
+        if solver not in sv.solvers:
+            raise ValueError("unknown solver '%s', use one of %s"
+                             % (solver, sorted(sv.solvers.keys())))
+        if sampling not in sa.designs:
+            raise ValueError("unknown sampling design '%s', use one of %s"
+                             % (sampling, sa.designs))
         self.numRuns = runs
         self.numPeriods = periods
         self.useGlobalTCSettings = useGlobalTCSettings
         self.normalizeTCs = normalizeTCs
+        self.engine = engine
+        self.batchSize = batchSize
+        self.solver = solver
+        self.solverTolerance = solverTolerance
+        self.solverBlockSize = solverBlockSize
+        self.workers = max(1, int(workers))
+        self.recordDirectory = recordDirectory
+        self.streaming = streaming
+        self.tolerance = tolerance
+        self.trackedPercentiles = trackedPercentiles
+        self.precision = None
+        self.sampling = sampling
+        self.commonRandomNumbers = commonRandomNumbers
+        if chunkSize is None:
+            chunkSize = 1000 if tolerance is None else 250
+        self.chunkSize = max(1, int(chunkSize))
+        if sampling == 'antithetic':
+            # the chunks must not split the pairs of runs
+            self.chunkSize += self.chunkSize % 2
+            if self.numRuns % 2:
+                self.numRuns += 1
+                print('antithetic sampling needs pairs of runs, using %d runs'
+                      % self.numRuns)
+        self.showProgress = True
         if seed is None:
-            self.seed = np.random.randint(1, 10000)
+            self.seed = int(np.random.default_rng().integers(1, 10000))
         else:
             self.seed = seed
         self.flowCompartments = []
         self.sinks = []
         self.stocks = []
         self.checkInflows = None
+        # the number of the first run the engine evaluates, the runs of a
+        # chunk or a shard are numbered from 0 by the engines
+        self.firstRun = 0
 
     def setModel(self, model):
         self.model = model
@@ -65,17 +196,127 @@ class Simulator(object):
         for i in range(len(self.compartments)):
             self.compartments[i].compNumber = i
 
+        recordRuns = self.numRuns
+        recordDirectory = self.recordDirectory
+        if self.streaming:
+            # the records only hold the runs of one chunk
+            recordRuns = min(self.chunkSize, self.numRuns)
+            recordDirectory = None
+        if recordDirectory is not None:
+            os.makedirs(recordDirectory, exist_ok=True)
+            recordDirectory = tempfile.mkdtemp(prefix='simulation_',
+                                               dir=recordDirectory)
+        # the directory of the record files of this simulation
+        self.recordFiles = recordDirectory
+
         for comp in self.compartments:
-            comp.initFlowLog(self.numRuns, self.numPeriods)
+            comp.initFlowLog(recordRuns, self.numPeriods, recordDirectory)
             if isinstance(comp, cp.FlowCompartment):
                 self.flowCompartments.append(comp)
             if isinstance(comp, cp.Sink):
                 self.sinks.append(comp)
-                comp.initInventory(self.numRuns, self.numPeriods)
+                comp.initInventory(recordRuns, self.numPeriods, 
+                                   recordDirectory)
             if isinstance(comp, cp.Stock):
                 self.stocks.append(comp)
                 comp.updateImmediateReleaseRate()
 
+        self.compileModel()
+        self.setRandomStream(self.seed)
+        self.flowSolver = sv.planSolver(self.solver, len(self.compartments),
+                                        self.transferTargets,
+                                        self.transferSources)
+        if self.solver == 'iterative' and self.solverBlockSize is not None:
+            # the planned solvers are shared, the setting only applies to the
+            # solver of this simulator
+            self.flowSolver = copy.copy(self.flowSolver)
+            self.flowSolver.minBlockSize = max(2, int(self.solverBlockSize))
+        # the last solution, the start of the iterative solver
+        self.lastSolution = None
+        sa.clearDesignValues(self.inflows, self.transfers)
+        self.design = None
+        if self.sampling in ['lhs', 'sobol']:
+            if self.commonRandomNumbers:
+                print('common random numbers are not supported by the %s '
+                      % self.sampling + 'design')
+            self.design = sa.SamplingDesign(self.sampling, self.inflows,
+                                            self.transfers, self.numPeriods,
+                                            self.numRuns, self.seed)
+        else:
+            self.design = sa.BlockSampler(self.inflows, self.transfers,
+                                          self.numPeriods, self.seed,
+                                          self.sampling == 'antithetic',
+                                          self.commonRandomNumbers)
+
+
+    def setRandomStream(self, seed):
+        """ gives all transfers and inflows a random stream (numpy Generator)
+        seeded with 'seed', which draws the random values the sampling design
+        does not provide (e.g. random choices from samples), so the
+        simulation does not depend on the global numpy random stream
+        """
+        # the spawn key separates the stream from those of the sampling
+        # designs with the same seed (see module sampling)
+        self.random = np.random.Generator(np.random.Philox(
+            np.random.SeedSequence(seed, spawn_key=(2**32 + 1,))))
+        for trans in self.transfers:
+            trans.random = self.random
+        for inflow in self.inflows:
+            inflow.random = self.random
+
+
+    def compileModel(self):
+        """ compiles the model structure into flat index arrays, so the flow
+        system of a period can be assembled without walking the compartments:
+
+        transfers: list<components.Transfer>
+            all transfers of the flow compartments and stocks
+        transferSources, transferTargets: array<int>
+            compartment numbers of the source and the target of every transfer
+        transferRates: array<float>, shape (transfers, periods)
+            the share of the flow over a transfer that is passed on in the
+            same period (1 for flow compartments, the immediate release rate
+            for stocks)
+        inflowTargets: array<int>
+            compartment numbers of the targets of the external inflows
+        releaseTargets: array<int>
+            compartment numbers of the targets of the stock releases, ordered
+            by stock and by the transfers of each stock
+        invariantPeriods: list<Boolean>
+            True for the periods in which all TCs are fixed, so the flow
+            matrix is the same in every run and is factorized only once
+        """
+        self.transfers = []
+        sources = []
+        rates = []
+        for comp in self.flowCompartments:
+            for trans in comp.transfers:
+                self.transfers.append(trans)
+                sources.append(comp.compNumber)
+                if isinstance(comp, cp.TDRStock):
+                    rates.append(comp.immediateReleaseRate[
+                                 trans.target.name][:self.numPeriods])
+                else:
+                    rates.append([comp.immediateReleaseRate]*self.numPeriods)
+
+        self.transferSources = np.array(sources, dtype=int)
+        self.transferTargets = np.array([t.target.compNumber for t in 
+                                         self.transfers], dtype=int)
+        self.transferRates = np.array(rates, dtype=float).reshape(
+                                      len(self.transfers), self.numPeriods)
+        self.inflowTargets = np.array([inflow.target.compNumber for inflow in
+                                       self.inflows], dtype=int)
+        self.releaseTargets = np.array([t.target.compNumber for stock in 
+                                        self.stocks for t in stock.transfers],
+                                        dtype=int)
+        # inflows and releases are added to the inflow vector in one step
+        self.sourceTargets = np.concatenate((self.inflowTargets,
+                                             self.releaseTargets))
+        self.invariantPeriods = [all(t.isFixed(period) for t in 
+                                     self.transfers) 
+                                 for period in range(self.numPeriods)]
+        self.periodFactors = {}  # factorized flow matrices by period
+
     def runSimulation(self):
         """ performs the simulation on the model with regard to the given
         parameters
@@ -91,26 +332,312 @@ class Simulator(object):
         print('\n                  calculating...')
         print('0%                                              100%')
         
+        if self.tolerance is not None:
+            self.__runAdaptive()
+        elif self.workers > 1 and self.numRuns > 1:
+            self.__runSharded()
+        elif self.streaming:
+            self.__runStreaming()
+        else:
+            self.__runEngine()
+
+        if self.streaming:
+            for comp, statistics in zip(self.compartments, 
+                                        self.recordStatistics):
+                for name in statistics:
+                    setattr(comp, name, statistics[name])
+
+        print('')
+        print('\nsimulation complete')
+
+
+    def __runEngine(self):
+        """ evaluates all runs of the simulator with the chosen engine
+        """
+        if self.engine == 'vectorized':
+            self.__runVectorized()
+        else:
+            self.__runLoop()
+
+
+    def __runStreaming(self):
+        """ evaluates the runs chunk by chunk and folds the records of every
+        chunk into the online statistics of the simulator
+        """
+        totalRuns = self.numRuns
+        showProgress = self.showProgress
+        self.showProgress = False
+        self.recordStatistics = [{} for comp in self.compartments]
+
+        signsToPrint = 50  # used for printing the progress
+        printedSigns = 0  # used for printing the progress
+
+        firstRun = self.firstRun
+        for start in range(0, totalRuns, self.chunkSize):
+            self.numRuns = min(self.chunkSize, totalRuns - start)
+            self.firstRun = firstRun + start
+            self.__initRecords()
+            self.__runEngine()
+            self.__foldRecords(self.__collectRecords())
+
+            progress = int(signsToPrint*(start + self.numRuns)/totalRuns) - \
+                       printedSigns
+            printedSigns += progress
+            if showProgress:
+                print("|" * progress, end="")
+
+        self.numRuns = totalRuns
+        self.firstRun = firstRun
+        self.showProgress = showProgress
+
+
+    def __runAdaptive(self):
+        """ evaluates the runs chunk by chunk until all tracked estimates
+        are within the tolerance or the maximum number of runs is reached
+        """
+        if self.workers > 1:
+            print('the adaptive mode runs in a single process')
+        maxRuns = self.numRuns
+        showProgress = self.showProgress
+        self.showProgress = False
+        # the records are allocated for the maximum number of runs, the chunks
+        # write into their rows
+        fullRecords = None if self.streaming else self.__collectRecords()
+        self.recordStatistics = [{} for comp in self.compartments]
+        monitor = ac.ConvergenceMonitor(self.numPeriods, 
+                                        self.trackedPercentiles,
+                                        pairedRuns = 
+                                        self.sampling == 'antithetic')
+
+        signsToPrint = 50  # used for printing the progress
+        printedSigns = 0  # used for printing the progress
+
+        finishedRuns = 0
+        while finishedRuns < maxRuns:
+            self.numRuns = min(self.chunkSize, maxRuns - finishedRuns)
+            self.firstRun = finishedRuns
+            self.__initRecords()
+            if fullRecords is not None:
+                self.__viewRecords(fullRecords, slice(finishedRuns, 
+                                   finishedRuns + self.numRuns))
+            self.__runEngine()
+            finishedRuns += self.numRuns
+
+            if self.streaming:
+                self.__foldRecords(self.__collectRecords())
+            trackedRecords = {}
+            for comp in self.flowCompartments:
+                if comp.logOutflows:
+                    for target in comp.outflowRecord:
+                        trackedRecords[comp.name, target] = \
+                        comp.outflowRecord[target]
+            for sink in self.sinks:
+                trackedRecords[sink.name] = sink.inventory
+            monitor.update(trackedRecords)
+            converged = monitor.converged(self.tolerance)
+
+            if converged:
+                progress = signsToPrint - printedSigns
+            else:
+                progress = int(signsToPrint*finishedRuns/maxRuns) - \
+                           printedSigns
+            printedSigns += progress
+            if showProgress:
+                print("|" * progress, end="")
+            if converged:
+                break
+
+        self.numRuns = finishedRuns
+        self.firstRun = 0
+        self.precision = monitor.precision()
+        if fullRecords is not None:
+            self.__viewRecords(fullRecords, slice(0, finishedRuns))
+        self.showProgress = showProgress
+        print('\nruns: %d, relative standard error: %g' % (self.numRuns, 
+                                                           self.precision))
+
+
+    def __viewRecords(self, records, runs):
+        """ sets the records of the compartments to the rows 'runs' of the
+        given records (see __collectRecords)
+        """
+        for comp, record in zip(self.compartments, records):
+            for name in record:
+                if isinstance(record[name], dict):
+                    setattr(comp, name, dict((target, record[name][target][runs])
+                                             for target in record[name]))
+                else:
+                    setattr(comp, name, record[name][runs])
+
+
+    def __foldRecords(self, records):
+        """ adds the records of a chunk of runs, or the statistics of a
+        shard, to the statistics of the simulator
+        """
+        for statistics, record in zip(self.recordStatistics, records):
+            for name in record:
+                if isinstance(record[name], dict):
+                    targetStatistics = statistics.setdefault(name, {})
+                    for target in record[name]:
+                        targetStatistics.setdefault(target, 
+                                ac.RecordStatistics(self.numPeriods)).update(
+                                record[name][target])
+                else:
+                    statistics.setdefault(name, ac.RecordStatistics(
+                                          self.numPeriods)).update(record[name])
+
+
+    def __initRecords(self):
+        """ allocates new records in the main memory for the current number
+        of runs
+        """
+        for comp in self.compartments:
+            comp.initFlowLog(self.numRuns, self.numPeriods)
+        for sink in self.sinks:
+            sink.initInventory(self.numRuns, self.numPeriods)
+
+
+    def __runSharded(self):
+        """ distributes the runs over worker processes and merges the records
+        of the shards back into the records of the compartments
+        """
+        global shardSimulator
+
+        if 'fork' not in mp.get_all_start_methods():
+            print('worker processes are not supported on this platform, ' +
+                  'running in a single process')
+            if self.streaming:
+                self.__runStreaming()
+            else:
+                self.__runEngine()
+            return
+
+        numShards = min(self.workers, self.numRuns)
+        bounds = np.linspace(0, self.numRuns, numShards + 1).astype(int)
+        shards = [(s, bounds[s], bounds[s+1]) for s in range(numShards)]
+
+        signsToPrint = 50  # used for printing the progress
+        printedSigns = 0  # used for printing the progress
+        finishedRuns = 0  # used for printing the progress
+
+        shardStatistics = [None] * numShards
+
+        # the workers are forked and inherit the model from this process
+        shardSimulator = self
+        try:
+            with mp.get_context('fork').Pool(numShards) as pool:
+                for shard, records in pool.imap_unordered(runShard, shards):
+                    shardNumber, start, stop = shard
+                    if self.streaming:
+                        shardStatistics[shardNumber] = records
+                    else:
+                        self.__mergeRecords(slice(start, stop), records)
+
+                    finishedRuns += stop - start
+                    progress = int(signsToPrint*finishedRuns/self.numRuns) - \
+                               printedSigns
+                    printedSigns += progress
+                    print("|" * progress, end="")
+        finally:
+            shardSimulator = None
+
+        if self.streaming:
+            # merged in the order of the shards to stay reproducible
+            self.recordStatistics = [{} for comp in self.compartments]
+            for statistics in shardStatistics:
+                self.__foldRecords(statistics)
+
+
+    def simulateShard(self, shardNumber, start, stop):
+        """ evaluates the runs start to stop (exclusive) in a worker process
+        with a random stream of its own
+
+        ------------
+        returns: the shard and a list with a dictionary of the records of \
+        every compartment (None, if the records are memory mapped; the \
+        statistics of the records in the streaming mode)
+        """
+        self.setRandomStream([self.seed, shardNumber])
+        mappedRecords = self.__collectRecords()
+        self.numRuns = stop - start
+        self.firstRun = start
+        self.showProgress = False
+
+        if self.streaming:
+            self.__runStreaming()
+            return (shardNumber, start, stop), self.recordStatistics
+
+        self.__initRecords()
+
+        if self.recordDirectory is not None:
+            # the mapped files are shared with the parent process, the shard
+            # writes its rows directly into them
+            self.__viewRecords(mappedRecords, slice(start, stop))
+
+        self.__runEngine()
+
+        if self.recordDirectory is not None:
+            return (shardNumber, start, stop), None
+        return (shardNumber, start, stop), self.__collectRecords()
+
+
+    def __collectRecords(self):
+        """ returns a list with a dictionary of the records of every
+        compartment
+        """
+        records = []
+        for comp in self.compartments:
+            records.append(dict((name, getattr(comp, name)) for name in 
+                                self.recordNames if hasattr(comp, name)))
+        return records
+
+
+    def __mergeRecords(self, runs, records):
+        """ copies the records of a shard into the rows 'runs' of the
+        records of the compartments
+        """
+        if records is None:
+            return
+        for comp, record in zip(self.compartments, records):
+            for name in record:
+                if isinstance(record[name], dict):
+                    for target in record[name]:
+                        getattr(comp, name)[target][runs] = record[name][target]
+                else:
+                    getattr(comp, name)[runs] = record[name]
+
+
+    def __runLoop(self):
+        """ evaluates the model run by run and period by period
+        """
         # progress display modified by RoBa, February 2016
         totalRuns = self.numRuns  # used for printing the progress
         lastIncrease = 0  # used for printing the progress
         signsToPrint = 50  # used for printing the progress
 
+        if self.design is not None:
+            designBlock = self.__designBlockSize()
+
         # modified by RoBa, December 2015
         for run in range(self.numRuns):
+
+            if self.design is not None:
+                if run % designBlock == 0:
+                    self.design.sample(min(designBlock, self.numRuns - run),
+                                       self.firstRun + run)
+                self.design.select(run % designBlock)
             
             if signsToPrint != 0 and run+1-lastIncrease >= float(totalRuns)/signsToPrint:
               progress = int((run+1-lastIncrease)/(float(totalRuns)/signsToPrint))
               totalRuns -= 1
               signsToPrint -= progress
               lastIncrease += 1
-              print("|" * progress, end="")
+              if self.showProgress:
+                  print("|" * progress, end="")
             
             for infl in self.inflows:
                 infl.sampleValues()
                 
-            allInflows = np.zeros((len(self.compartments), self.numPeriods))
-            
             for period in range (self.numPeriods):
                 for comp in self.flowCompartments:
                     comp.determineTCs(self.useGlobalTCSettings,
@@ -122,41 +649,34 @@ class Simulator(object):
                 for sink in self.sinks:
                     sink.updateInventory(run, period)
 
-                for inflow in self.inflows:
-                    allInflows[self.compartments.index(inflow.target), period]\
-                    = allInflows[self.compartments.index(inflow.target), 
-                                 period] + inflow.getCurrentInflow(period)
-
+                sourceAmounts = [inflow.getCurrentInflow(period) for inflow
+                                 in self.inflows]
                 for stock in self.stocks:
                     localReleases = stock.releaseMaterial(run, period)
-                    for locRel in list(localReleases.keys()):
-                        allInflows [locRel.compNumber, period]= \
-                        allInflows[locRel.compNumber, period] + \
-                        localReleases [locRel]
-
-                        
-                inflowVector = allInflows[:,period]
-                flowMatrix = np.zeros(shape=(len(self.compartments), 
-                                             len(self.compartments)))
-                np.fill_diagonal(flowMatrix, 1)
-                
-                # modified by RoBa, January 2016
-                for compartment in self.flowCompartments:
-                    if isinstance(compartment, cp.TDRStock):
-                        for trans in compartment.transfers:
-                            flowMatrix[trans.target.compNumber, 
-                                   compartment.compNumber]= \
-                                   -trans.getCurrentTC()*\
-                                   compartment.immediateReleaseRate[
-                                                     trans.target.name][period]
+                    sourceAmounts.extend(localReleases[t.target] for t in 
+                                         stock.transfers)
+                inflowVector = np.bincount(self.sourceTargets,
+                                           weights=sourceAmounts,
+                                           minlength=len(self.compartments))
+
+                if period in self.periodFactors:
+                    solutionVector = self.flowSolver.solveFactorized(
+                                     self.periodFactors[period], inflowVector)
+                else:
+                    currentTCs = [t.getCurrentTC() for t in self.transfers]
+                    flowMatrix = self.flowSolver.assemble(
+                        np.multiply(currentTCs, self.transferRates[:, period]))
+
+                    if self.invariantPeriods[period]:
+                        self.periodFactors[period] = \
+                            self.flowSolver.factorize(flowMatrix)
+                        solutionVector = self.flowSolver.solveFactorized(
+                                     self.periodFactors[period], inflowVector)
                     else:
-                        for trans in compartment.transfers:
-                            flowMatrix[trans.target.compNumber, 
-                                   compartment.compNumber]= \
-                                   -trans.getCurrentTC()*\
-                                   compartment.immediateReleaseRate
-                                                                      
-                solutionVector = la.solve(flowMatrix, inflowVector)
+                        solutionVector = self.flowSolver.solve(flowMatrix, 
+                                         inflowVector, self.lastSolution,
+                                         self.solverTolerance)
+                        self.lastSolution = solutionVector
                 
                 for i in self.compartments:
                     i.logFlow(run, period, solutionVector[i.compNumber])
@@ -164,8 +684,200 @@ class Simulator(object):
                 for i in self.sinks:
                     i.storeMaterial(run, period, solutionVector[i.compNumber])
 
-        print('')
-        print('\nsimulation complete')
+
+    def __runVectorized(self):
+        """ evaluates the model for batches of runs; within a batch, every
+        period is sampled, assembled and solved for all runs at once. In
+        models without stocks, the periods are independent and the systems
+        of several periods are solved together.
+        """
+        batchSize = self.batchSize
+        if batchSize is None:
+            batchSize = max(1, int(2**23 / max(self.flowSolver.matrixSize(),
+                                               1)))
+        if self.design is not None:
+            batchSize = min(batchSize, self.__designBlockSize())
+        batchSize = min(batchSize, self.numRuns)
+
+        signsToPrint = 50  # used for printing the progress
+        printedSigns = 0  # used for printing the progress
+
+        for start in range(0, self.numRuns, batchSize):
+            runs = slice(start, min(start + batchSize, self.numRuns))
+            numBatchRuns = runs.stop - runs.start
+
+            if self.design is not None:
+                self.design.sample(numBatchRuns, self.firstRun + start)
+            for infl in self.inflows:
+                infl.sampleValues(numBatchRuns)
+
+            if self.stocks:
+                self.__runPeriods(runs, numBatchRuns)
+            else:
+                # without stocks, the periods do not depend on each other
+                self.__runHorizon(runs, numBatchRuns)
+
+            progress = int(signsToPrint*runs.stop/self.numRuns) - printedSigns
+            printedSigns += progress
+            if self.showProgress:
+                print("|" * progress, end="")
+
+
+    def __runPeriods(self, runs, numBatchRuns):
+        """ evaluates a batch of runs period by period """
+        numComps = len(self.compartments)
+
+        for period in range (self.numPeriods):
+            for comp in self.flowCompartments:
+                comp.determineTCs(self.useGlobalTCSettings,
+                                  self.normalizeTCs, period, numBatchRuns)
+
+            for sink in self.sinks:
+                sink.updateInventory(runs, period)
+
+            # one row of amounts per inflow or release, one column per run
+            sourceAmounts = np.empty((len(self.sourceTargets),
+                                      numBatchRuns))
+            for i in range(len(self.inflows)):
+                sourceAmounts[i] = self.inflows[i].getCurrentInflow(period)
+            i = len(self.inflows)
+            for stock in self.stocks:
+                localReleases = stock.releaseMaterial(runs, period)
+                for t in stock.transfers:
+                    sourceAmounts[i] = localReleases[t.target]
+                    i += 1
+            inflowVectors = np.zeros((numComps, numBatchRuns))
+            np.add.at(inflowVectors, self.sourceTargets, sourceAmounts)
+
+            if self.invariantPeriods[period]:
+                # one flow matrix for all runs, factorized only once
+                if period not in self.periodFactors:
+                    currentTCs = [np.ravel(t.getCurrentTC())[0] for t in
+                                  self.transfers]
+                    flowMatrix = self.flowSolver.assemble(np.multiply(
+                              currentTCs, self.transferRates[:, period]))
+                    self.periodFactors[period] = \
+                        self.flowSolver.factorize(flowMatrix)
+                solutionVectors = self.flowSolver.solveFactorized(
+                                  self.periodFactors[period], 
+                                  inflowVectors.T)
+            else:
+                currentTCs = np.empty((len(self.transfers), numBatchRuns))
+                for i in range(len(self.transfers)):
+                    currentTCs[i] = self.transfers[i].getCurrentTC()
+                flowMatrices = self.flowSolver.assemble(currentTCs *
+                               self.transferRates[:, period, np.newaxis])
+
+                start = self.lastSolution
+                if np.shape(start) != (numBatchRuns, numComps):
+                    start = None
+                solutionVectors = self.flowSolver.solve(flowMatrices, 
+                                  inflowVectors.T, start,
+                                  self.solverTolerance)
+                self.lastSolution = solutionVectors
+
+            for i in self.compartments:
+                i.logFlow(runs, period, solutionVectors[:, i.compNumber])
+
+            for i in self.sinks:
+                i.storeMaterial(runs, period, 
+                                solutionVectors[:, i.compNumber])
+
+
+    def __runHorizon(self, runs, numBatchRuns):
+        """ evaluates a batch of runs of a model without stocks. The TCs and
+        inflows of all periods are sampled first, in the same order as by
+        __runPeriods; the flow systems of as many periods as fit into the
+        memory of a batch are then solved with one call, and the flows are
+        logged period by period.
+        """
+        numComps = len(self.compartments)
+        periodTCs = []
+        inflowVectors = np.empty((self.numPeriods, numBatchRuns, numComps))
+        for period in range (self.numPeriods):
+            for comp in self.flowCompartments:
+                comp.determineTCs(self.useGlobalTCSettings,
+                                  self.normalizeTCs, period, numBatchRuns)
+
+            currentTCs = np.empty((len(self.transfers), numBatchRuns))
+            for i in range(len(self.transfers)):
+                currentTCs[i] = self.transfers[i].getCurrentTC()
+            periodTCs.append(currentTCs)
+
+            sourceAmounts = np.empty((len(self.inflows), numBatchRuns))
+            for i in range(len(self.inflows)):
+                sourceAmounts[i] = self.inflows[i].getCurrentInflow(period)
+            periodInflows = np.zeros((numComps, numBatchRuns))
+            np.add.at(periodInflows, self.sourceTargets, sourceAmounts)
+            inflowVectors[period] = periodInflows.T
+
+        solutionVectors = np.empty((self.numPeriods, numBatchRuns, numComps))
+        variablePeriods = []
+        for period in range (self.numPeriods):
+            if not self.invariantPeriods[period]:
+                variablePeriods.append(period)
+                continue
+            if period not in self.periodFactors:
+                flowMatrix = self.flowSolver.assemble(periodTCs[period][:, 0] *
+                                            self.transferRates[:, period])
+                self.periodFactors[period] = \
+                    self.flowSolver.factorize(flowMatrix)
+            solutionVectors[period] = self.flowSolver.solveFactorized(
+                                      self.periodFactors[period], 
+                                      inflowVectors[period])
+
+        # the periods solved together, the flow matrices of one call take
+        # about as much memory as the ones of a period of a full batch
+        groupSize = max(1, int(2**23 / max(self.flowSolver.matrixSize() *
+                                           numBatchRuns, 1)))
+        for first in range(0, len(variablePeriods), groupSize):
+            group = variablePeriods[first:first + groupSize]
+            flowMatrices = self.flowSolver.assemble(np.concatenate(
+                [periodTCs[period] * self.transferRates[:, period, np.newaxis]
+                 for period in group], axis=1))
+            solutionVectors[group] = self.flowSolver.solve(flowMatrices,
+                inflowVectors[group].reshape(-1, numComps), None,
+                self.solverTolerance).reshape(len(group), numBatchRuns,
+                                              numComps)
+
+        for period in range (self.numPeriods):
+            # the outflows are logged with the TCs of the period
+            for i in range(len(self.transfers)):
+                self.transfers[i].currentTC = periodTCs[period][i]
+
+            for sink in self.sinks:
+                sink.updateInventory(runs, period)
+
+            for i in self.compartments:
+                i.logFlow(runs, period, solutionVectors[period][:, 
+                                                              i.compNumber])
+
+            for i in self.sinks:
+                i.storeMaterial(runs, period, 
+                                solutionVectors[period][:, i.compNumber])
+
+
+    def __designBlockSize(self):
+        """ the number of runs for which the sampling design is drawn at
+        once, chosen to keep the design values at about 64 MB
+        """
+        return max(1, int(2**23 / max(len(self.design.inputs), 1)))
+
+
+    def deleteRecords(self):
+        """ deletes the files of the memory mapped records (see
+        recordDirectory) and the record directory, if no other files are
+        left in it. The records must not be used anymore afterwards.
+        """
+        if getattr(self, 'recordFiles', None) is None:
+            return
+        shutil.rmtree(self.recordFiles, ignore_errors=True)
+        try:
+            os.rmdir(self.recordDirectory)
+        except OSError:
+            # other simulations keep their records in the directory
+            pass
+        self.recordFiles = None
 
 
     def getAllStockedMaterial(self):
@@ -371,3 +1083,14 @@ class Simulator(object):
         return self.model.categoriesList
 
 
+
+# the simulator whose runs are evaluated by the worker processes
+shardSimulator = None
+
+def runShard(shard):
+    """ evaluates a shard (shard number, first run, last run exclusive) of
+    the runs of the shardSimulator; used as the task of the worker processes
+    """
+    return shardSimulator.simulateShard(*shard)
+
+
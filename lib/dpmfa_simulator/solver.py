@@ -0,0 +1,505 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+"""
+Created in October 2026
+
+The solver module contains the backends the Simulator uses to solve the
+linear system of a period, flowMatrix * x = inflowVector, for the total inflow
+x to every compartment.
+
+A solver assembles the flow matrix of a period from the coefficients of the
+transfers (assemble) and solves the system for the inflows. All solvers accept
+a single system (coefficients of shape (transfers,), inflowVector of shape
+(n,)) as well as a stack of systems, e.g. one for every run of a batch
+(coefficients of shape (transfers, runs), inflowVector of shape (runs, n)).
+The dense solvers assemble arrays of shape (n, n) or (runs, n, n), the sparse
+solver matrices in the compressed sparse column format.
+If the flow matrix is the same for all runs of a period, it is factorized once
+(factorize) and the factors are used for the inflow vectors of all runs
+(solveFactorized).
+Iterative solvers begin with the estimate start of the solution (e.g. the
+solution of the previous period) and iterate until the relative change is
+below tolerance; the direct solvers ignore both arguments.
+
+A solver only depends on the topology of the model, so planned solvers are
+kept by a fingerprint of the topology and reused for all models with the same
+compartments and transfers (see planSolver).
+"""
+
+import hashlib
+import numpy as np
+import numpy.linalg as la
+import scipy.linalg as sl
+import scipy.sparse as sp
+import scipy.sparse.linalg as spl
+
+
+class FlowSolver(object):
+    """ Base class of the solvers, assembles dense flow matrices.
+
+    Parameters:
+    ----------------
+    numCompartments: integer
+        the number of model compartments
+    transferTargets, transferSources: array<int>
+        compartment numbers of the target and the source of every transfer \
+        (see Simulator.compileModel)
+    """
+    def __init__(self, numCompartments = 0, transferTargets = [],
+                 transferSources = []):
+        self.numCompartments = numCompartments
+        self.transferTargets = np.asarray(transferTargets, dtype=int)
+        self.transferSources = np.asarray(transferSources, dtype=int)
+
+    def assemble(self, coefficients):
+        """ returns the flow matrix I - T of the coefficients (transfer
+        coefficients times transfer rates) of all transfers, one matrix per
+        run if the coefficients have a column per run
+        """
+        n = self.numCompartments
+        if np.ndim(coefficients) == 1:
+            flowMatrix = np.zeros(shape=(n, n))
+            np.fill_diagonal(flowMatrix, 1)
+            flowMatrix[self.transferTargets, self.transferSources] = \
+            -np.asarray(coefficients)
+            return flowMatrix
+        flowMatrices = np.zeros((np.shape(coefficients)[1], n, n))
+        flowMatrices[:, np.arange(n), np.arange(n)] = 1
+        flowMatrices[:, self.transferTargets, self.transferSources] = \
+        -np.transpose(coefficients)
+        return flowMatrices
+
+    def matrixSize(self):
+        """ returns the number of stored entries of the flow matrix of a run
+        """
+        return self.numCompartments**2
+
+
+
+class DenseSolver(FlowSolver):
+    """ Solves the flow system with a dense LU factorization of the whole
+    flow matrix.
+    """
+    def solve(self, flowMatrix, inflowVector, start = None, tolerance = None):
+        if np.ndim(inflowVector) == 1:
+            return la.solve(flowMatrix, inflowVector)
+        return la.solve(flowMatrix, inflowVector[..., np.newaxis])[..., 0]
+
+    def factorize(self, flowMatrix):
+        return sl.lu_factor(flowMatrix, check_finite=False)
+
+    def solveFactorized(self, factors, inflowVector):
+        """ solves the system for one inflow vector (shape (n,)) or for the
+        inflow vectors of several runs at once (shape (runs, n))
+        """
+        return sl.lu_solve(factors, np.transpose(inflowVector),
+                           check_finite=False).T
+
+
+
+class SCCSolver(FlowSolver):
+    """ Solves the flow system block by block along the strongly connected
+    components of the model graph.
+
+    The components are determined once per model. Compartments that are not
+    part of a loop are solved by forward substitution in topological order;
+    all compartments of the same topological level are substituted at once.
+    Only the recycling loops (cyclic components) are solved with a dense
+    factorization of their own, small block of the flow matrix.
+
+    Parameters:
+    ----------------
+    numCompartments: integer
+        the number of model compartments
+    transferTargets, transferSources: array<int>
+        compartment numbers of the target and the source of every transfer \
+        (see Simulator.compileModel)
+    """
+    def __init__(self, numCompartments, transferTargets, transferSources):
+        super(SCCSolver, self).__init__(numCompartments, transferTargets,
+                                        transferSources)
+        # (target, source) of every transfer
+        self.edges = list(zip(np.asarray(transferTargets).tolist(),
+                              np.asarray(transferSources).tolist()))
+
+        self.blocks = self.__findComponents()
+        self.levels = self.__planLevels()
+
+
+    def __findComponents(self):
+        """ returns the strongly connected components (lists of compartment
+        numbers) in topological order, using an iterative version of
+        Tarjan's algorithm
+        """
+        successors = [[] for i in range(self.numCompartments)]
+        for target, source in self.edges:
+            successors[source].append(target)
+
+        index = [None] * self.numCompartments
+        lowLink = [0] * self.numCompartments
+        onStack = [False] * self.numCompartments
+        stack = []
+        components = []
+        counter = 0
+
+        for root in range(self.numCompartments):
+            if index[root] is not None:
+                continue
+            work = [(root, 0)]
+            while work:
+                node, i = work.pop()
+                if i == 0:
+                    index[node] = lowLink[node] = counter
+                    counter += 1
+                    stack.append(node)
+                    onStack[node] = True
+                recurse = False
+                for j in range(i, len(successors[node])):
+                    succ = successors[node][j]
+                    if index[succ] is None:
+                        work.append((node, j + 1))
+                        work.append((succ, 0))
+                        recurse = True
+                        break
+                    elif onStack[succ]:
+                        lowLink[node] = min(lowLink[node], index[succ])
+                if recurse:
+                    continue
+                if lowLink[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        onStack[member] = False
+                        component.append(member)
+                        if member == node:
+                            break
+                    components.append(sorted(component))
+                if work:
+                    parent = work[-1][0]
+                    lowLink[parent] = min(lowLink[parent], lowLink[node])
+
+        # Tarjan's algorithm finds the components in reverse topological order
+        components.reverse()
+        return components
+
+
+    def __planLevels(self):
+        """ groups the components into topological levels. Every level holds
+        the acyclic compartments that can be substituted together and the
+        cyclic blocks that have to be solved one by one.
+        """
+        blockOf = np.empty(self.numCompartments, dtype=int)
+        for b, block in enumerate(self.blocks):
+            blockOf[block] = b
+
+        predecessors = [set() for block in self.blocks]
+        for target, source in self.edges:
+            if blockOf[target] != blockOf[source]:
+                predecessors[blockOf[target]].add(source)
+
+        blockLevel = [0] * len(self.blocks)
+        for b in range(len(self.blocks)):
+            for source in predecessors[b]:
+                blockLevel[b] = max(blockLevel[b], blockLevel[blockOf[source]]+1)
+
+        levels = []
+        for level in range(max(blockLevel) + 1 if self.blocks else 0):
+            singles = []
+            cycles = []
+            for b in range(len(self.blocks)):
+                if blockLevel[b] != level:
+                    continue
+                if len(self.blocks[b]) == 1:
+                    singles.append(self.blocks[b][0])
+                else:
+                    cycles.append((np.array(self.blocks[b]),
+                                   np.array(sorted(predecessors[b]),
+                                            dtype=int)))
+            singles = np.array(sorted(singles), dtype=int)
+            position = dict((node, i) for i, node in enumerate(singles))
+            edgeTargets = []
+            edgeSources = []
+            edgePositions = []
+            for target, source in self.edges:
+                if target in position and source != target:
+                    edgeTargets.append(target)
+                    edgeSources.append(source)
+                    edgePositions.append(position[target])
+            levels.append((singles, np.array(edgeTargets, dtype=int),
+                           np.array(edgeSources, dtype=int),
+                           np.array(edgePositions, dtype=int), cycles))
+        return levels
+
+
+    def solve(self, flowMatrix, inflowVector, start = None, tolerance = None):
+        return self.__substitute(flowMatrix, inflowVector, start=start,
+                                 tolerance=tolerance)
+
+
+    def factorize(self, flowMatrix):
+        """ returns the flow matrix and the LU factors of its cyclic blocks """
+        blockFactors = []
+        for level in self.levels:
+            for block, preds in level[4]:
+                blockFactors.append(sl.lu_factor(
+                    flowMatrix[block[:, np.newaxis], block], check_finite=False))
+        return flowMatrix, blockFactors
+
+
+    def solveFactorized(self, factors, inflowVector):
+        flowMatrix, blockFactors = factors
+        return self.__substitute(flowMatrix, inflowVector, blockFactors)
+
+
+    def solveBlock(self, blockMatrices, rhs, start = None, tolerance = None):
+        """ solves the systems of a cyclic block for all runs (blockMatrices
+        of shape (runs, m, m), rhs of shape (runs, m))
+        """
+        return la.solve(blockMatrices, rhs[:, :, np.newaxis])[:, :, 0]
+
+
+    def __substitute(self, flowMatrix, inflowVector, blockFactors = None,
+                     start = None, tolerance = None):
+        """ solves the levels one after the other; with blockFactors, one
+        flow matrix is used for all inflow vectors
+        """
+        batchShape = np.shape(inflowVector)[:-1]
+        n = self.numCompartments
+        flowMatrix = np.reshape(flowMatrix, (-1, n, n))
+        inflowVector = np.reshape(inflowVector, (-1, n))
+        if start is not None:
+            start = np.reshape(start, (-1, n))
+        solution = np.zeros(inflowVector.shape)
+        cycle = 0
+
+        for singles, edgeTargets, edgeSources, edgePositions, cycles in \
+        self.levels:
+            if len(singles):
+                rhs = inflowVector[:, singles].copy()
+                np.add.at(rhs, (slice(None), edgePositions),
+                          -flowMatrix[:, edgeTargets, edgeSources] *
+                          solution[:, edgeSources])
+                solution[:, singles] = rhs / flowMatrix[:, singles, singles]
+
+            for block, preds in cycles:
+                rhs = inflowVector[:, block]
+                if blockFactors is not None:
+                    if len(preds):
+                        rhs = rhs - solution[:, preds] @ \
+                              flowMatrix[0][block[:, np.newaxis], preds].T
+                    solution[:, block] = sl.lu_solve(blockFactors[cycle],
+                                         rhs.T, check_finite=False).T
+                    cycle += 1
+                    continue
+                if len(preds):
+                    rhs = rhs - np.einsum('rij,rj->ri',
+                                flowMatrix[:, block[:, np.newaxis], preds],
+                                solution[:, preds])
+                solution[:, block] = self.solveBlock(
+                    flowMatrix[:, block[:, np.newaxis], block], rhs,
+                    None if start is None else start[:, block], tolerance)
+
+        return solution.reshape(batchShape + (n,))
+
+
+
+
+class IterativeSolver(SCCSolver):
+    """ Solves the flow system like the SCCSolver, but iterates the recycling
+    loops instead of factorizing them.
+
+    The system of a cyclic block, (D + L + U) x = rhs, is solved with
+    Gauss-Seidel sweeps (D + L) x' = rhs - U x, each a triangular solve of
+    O(m^2). The sweeps start from a given estimate, e.g. the solution of the
+    previous period, and stop for every run as soon as none of its inflows
+    changes by more than tolerance times its largest inflow of the block. As the loop gains of
+    material flows are well below 1, a few sweeps are enough and large loops
+    are solved without an O(m^3) factorization. Runs that do not converge
+    within maxSweeps (e.g. loops without any losses) and blocks of fewer
+    than minBlockSize compartments, which are factorized faster than swept,
+    are factorized.
+    Periods whose flow matrix is the same for all runs still factorize their
+    loops once (see SCCSolver.factorize), as the factors serve all runs.
+    """
+    defaultTolerance = 1e-12
+    maxSweeps = 200
+    # a batched sweep costs up to half of a batched LU factorization of the
+    # loop; with the 20 to 40 sweeps of the default tolerance, iterating
+    # only pays off from about 512 compartments, with warm starts and a
+    # tolerance of 1e-6 from about 256 (see Simulator.solverBlockSize)
+    minBlockSize = 512
+
+    def solveBlock(self, blockMatrices, rhs, start = None, tolerance = None):
+        if blockMatrices.shape[1] < self.minBlockSize:
+            return super(IterativeSolver, self).solveBlock(blockMatrices, rhs)
+        if tolerance is None:
+            tolerance = self.defaultTolerance
+        if start is None:
+            inflows = rhs / np.diagonal(blockMatrices, axis1=1, axis2=2)
+        else:
+            inflows = np.array(start, dtype=float)
+
+        # every run is swept until its own inflows converge; the matrices of
+        # the runs still sweeping are only gathered again when runs drop out
+        active = np.arange(len(rhs))
+        failed = []
+        lower = None
+        for sweep in range(self.maxSweeps):
+            if lower is None:
+                # the triangular solves only read the lower triangle
+                lower = np.ascontiguousarray(blockMatrices[active])
+                upper = np.triu(lower, 1)
+                activeRhs = rhs[active]
+            nextInflows = self.__solveLower(lower, activeRhs - 
+                          (upper @ inflows[active, :, np.newaxis])[:, :, 0])
+            change = np.max(np.abs(nextInflows - inflows[active]), axis=1)
+            inflows[active] = nextInflows
+            converged = change <= tolerance * np.max(np.abs(nextInflows), 
+                                                     axis=1)
+            diverged = ~np.isfinite(change)
+            if converged.any() or diverged.any():
+                failed.extend(active[diverged])
+                active = active[~(converged | diverged)]
+                lower = None
+            if len(active) == 0:
+                break
+
+        # runs that do not converge (e.g. loops without losses) are factorized
+        failed = np.concatenate((np.asarray(failed, dtype=int), active))
+        if len(failed):
+            inflows[failed] = super(IterativeSolver, self).solveBlock(
+                              blockMatrices[failed], rhs[failed])
+        return inflows
+
+
+    def __solveLower(self, lower, rhs):
+        """ solves the lower triangular systems of all runs """
+        try:
+            return sl.solve_triangular(lower, rhs[:, :, np.newaxis], 
+                                       lower=True, check_finite=False)[:, :, 0]
+        except ValueError:
+            # scipy versions before 1.15 only solve one system per call
+            return np.array([sl.solve_triangular(lower[r], rhs[r], lower=True,
+                             check_finite=False) for r in range(len(rhs))])
+
+
+
+
+class SparseSolver(FlowSolver):
+    """ Solves the flow system with a sparse LU factorization (SuperLU).
+
+    The sparsity pattern of the flow matrix, the diagonal and one entry per
+    transfer, is built once per model in the compressed sparse column format;
+    assemble only fills the data array of the pattern for a period. The rows
+    and columns are ordered along the strongly connected components of the
+    model graph in topological order (see SCCSolver), so the matrix is block
+    lower triangular and the factorization keeps this column order and only
+    fills in within the recycling loops. The memory and the time needed grow
+    with the number of transfers instead of the square (cube) of the number
+    of compartments, so also models of thousands of compartments are solved.
+    """
+    def __init__(self, numCompartments, transferTargets, transferSources):
+        super(SparseSolver, self).__init__(numCompartments, transferTargets,
+                                           transferSources)
+        n = numCompartments
+        blocks = planSolver('scc', n, transferTargets, transferSources).blocks
+        # the order of the compartments in the matrix and its inverse
+        self.order = np.array([c for block in blocks for c in block],
+                              dtype=int)
+        position = np.empty(n, dtype=int)
+        position[self.order] = np.arange(n)
+
+        # one slot per matrix entry, the diagonal first; a transfer replaces
+        # an entry at the same place, like in the dense flow matrix
+        rows = np.concatenate((position, position[self.transferTargets]))
+        columns = np.concatenate((position, position[self.transferSources]))
+        entries, entrySlots = np.unique(columns * n + rows,
+                                        return_inverse=True)
+        self.indices = entries % n
+        self.indptr = np.searchsorted(entries // n, np.arange(n + 1))
+        self.data = np.zeros(len(entries))
+        self.data[entrySlots[:n]] = 1
+        self.transferSlots = entrySlots[n:]
+
+
+    def assemble(self, coefficients):
+        if np.ndim(coefficients) == 1:
+            data = self.data.copy()
+            data[self.transferSlots] = -np.asarray(coefficients)
+            return sp.csc_matrix((data, self.indices, self.indptr),
+                                 shape=(self.numCompartments,
+                                        self.numCompartments))
+        return [self.assemble(runCoefficients) for runCoefficients in
+                np.transpose(coefficients)]
+
+
+    def matrixSize(self):
+        return len(self.data)
+
+
+    def solve(self, flowMatrix, inflowVector, start = None, tolerance = None):
+        if np.ndim(inflowVector) == 1:
+            return self.solveFactorized(self.factorize(flowMatrix),
+                                        inflowVector)
+        return np.array([self.solve(flowMatrix[r], inflowVector[r]) for r
+                         in range(len(inflowVector))])
+
+
+    def factorize(self, flowMatrix):
+        # the columns are already in a good order, pivots on the diagonal
+        # keep it
+        return spl.splu(flowMatrix, permc_spec='NATURAL',
+                        diag_pivot_thresh=0.1)
+
+
+    def solveFactorized(self, factors, inflowVector):
+        solution = np.empty(np.shape(inflowVector))
+        solution[..., self.order] = factors.solve(np.ascontiguousarray(
+                                    np.transpose(inflowVector[..., self.order])
+                                    )).T
+        return solution
+
+
+
+solvers = {'dense': DenseSolver, 'scc': SCCSolver, 
+           'iterative': IterativeSolver, 'sparse': SparseSolver}
+
+# planned solvers by (solver name, topology fingerprint)
+plannedSolvers = {}
+maxPlannedSolvers = 64
+
+
+def topologyFingerprint(numCompartments, transferTargets, transferSources):
+    """ returns a fingerprint of the model topology: the number of
+    compartments and the target and the source of every transfer
+    """
+    digest = hashlib.sha1(str(numCompartments).encode())
+    digest.update(np.asarray(transferTargets, dtype=np.int64).tobytes())
+    digest.update(b'|')
+    digest.update(np.asarray(transferSources, dtype=np.int64).tobytes())
+    return digest.hexdigest()
+
+
+def planSolver(name, numCompartments, transferTargets, transferSources):
+    """ returns a solver of the given name for the model topology; the plan
+    of a solver (e.g. the strongly connected components and the levels of the
+    SCCSolver) is reused for every model with the same topology
+
+    Parameters:
+    ----------------
+    name: string
+        the name of the solver in solvers
+    numCompartments: integer
+        the number of model compartments
+    transferTargets, transferSources: array<int>
+        compartment numbers of the target and the source of every transfer
+    """
+    key = (name, topologyFingerprint(numCompartments, transferTargets,
+                                     transferSources))
+    if key not in plannedSolvers:
+        if len(plannedSolvers) >= maxPlannedSolvers:
+            # forget the plan that was made first
+            plannedSolvers.pop(next(iter(plannedSolvers)))
+        plannedSolvers[key] = solvers[name](numCompartments, transferTargets,
+                                            transferSources)
+    return plannedSolvers[key]
@@ -14,6 +14,7 @@ and where needed the concentration of a substance from the source file.
 import numpy as np
 import sys
 
+from lib.dpmfa_simulator import accumulators as ac
 from lib.entropy_calculation.flow import Flow
 from lib.entropy_calculation.period import Period
 from lib.entropy_calculation.conversion import Conversion
@@ -40,7 +41,7 @@ class Entropy:
         for comp in simulator.flowCompartments:
             for key in list(comp.outflowRecord.keys()):
                 self.flowValues[comp.name, key] = []
-                self.flowValues[comp.name, key].append(np.mean(comp.outflowRecord[key], axis=0).tolist())
+                self.flowValues[comp.name, key].append(ac.mean(comp.outflowRecord[key]).tolist())
 
         self.metadataMatrix = system.metadataMatrix
         self.fillPeriods()
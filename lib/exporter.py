@@ -17,6 +17,7 @@ import zipfile
 import shutil
 import csv
 import numpy as np
+from .dpmfa_simulator import accumulators as ac
 
 
 class CSVExporter(object):
@@ -65,30 +66,27 @@ class CSVExporter(object):
         for comp in simulator.flowCompartments:
             for key in list(comp.outflowRecord.keys()):
                 flowValues[comp.name, key] = []
-                flowValues[comp.name, key].append(np.mean(comp.outflowRecord[key],
-                                                          axis=0).tolist())
+                flowValues[comp.name, key].append(
+                    ac.mean(comp.outflowRecord[key]).tolist())
                 if system.median and self.runs != 1:
-                    flowValues[comp.name, key].append(np.median(comp.outflowRecord[key],
-                                                                axis=0).tolist())
+                    flowValues[comp.name, key].append(
+                        ac.median(comp.outflowRecord[key]).tolist())
                 if len(system.percentiles) != 0 and self.runs != 1:
                     for i in range(len(system.percentiles)):
-                        flowValues[comp.name, key].append(np.percentile(
+                        flowValues[comp.name, key].append(ac.percentile(
                             comp.outflowRecord[key],
-                            system.percentiles[i],
-                            axis=0).tolist())
+                            system.percentiles[i]).tolist())
 
         # log stock data from stocks and sinks
         for sink in simulator.sinks:
             stockValues[sink.name] = []
-            stockValues[sink.name].append(np.mean(sink.inventory, axis=0).tolist())
+            stockValues[sink.name].append(ac.mean(sink.inventory).tolist())
             if system.median and self.runs != 1:
-                stockValues[sink.name].append(np.median(sink.inventory,
-                                                        axis=0).tolist())
+                stockValues[sink.name].append(ac.median(sink.inventory).tolist())
             if len(system.percentiles) != 0 and self.runs != 1:
                 for i in range(len(system.percentiles)):
-                    stockValues[sink.name].append(np.percentile(sink.inventory,
-                                                                system.percentiles[i],
-                                                                axis=0).tolist())
+                    stockValues[sink.name].append(ac.percentile(sink.inventory,
+                                                                system.percentiles[i]).tolist())
 
         # creating data rows for links
         for i in range(len(system.metadataMatrix)):
@@ -173,6 +171,9 @@ class CSVExporter(object):
         table = []
         table.append(["Runs:", self.runs])
         table.append(["Periods:", self.periods])
+        if system.tolerance is not None:
+            table.append(["Tolerance:", system.tolerance])
+            table.append(["Precision:", system.precision])
         table.append([])
         table.append(linkHeader)
         for i in range(len(linkMeanRows)):
@@ -314,21 +315,21 @@ class CSVExporter(object):
                         continue
                     plt.ylabel(material + ' in ' + unit)
                     plt.title(capitalizedName + '\nInflows')
-                    for row in comp.inflowRecord:
+                    for row in ac.runValues(comp.inflowRecord):
                         if self.runs == 1:
                             plt.plot(timeIDs, row, color='0.3', lw=1)
                         else:
                             plt.plot(timeIDs, row, color='0.7', lw=0.1)
                     if self.runs != 1:
-                        plt.plot(timeIDs, np.mean(comp.inflowRecord, axis=0), color='r',
+                        plt.plot(timeIDs, ac.mean(comp.inflowRecord), color='r',
                                  lw=1, label="mean")
                         if self.system.median:
-                            plt.plot(timeIDs, np.median(comp.inflowRecord, axis=0),
+                            plt.plot(timeIDs, ac.median(comp.inflowRecord),
                                      color='b', lw=1, label="median")
                         if len(self.system.percentiles) != 0:
                             for i in range(len(self.system.percentiles)):
-                                plt.plot(timeIDs, np.percentile(comp.inflowRecord,
-                                                                self.system.percentiles[i], axis=0), color='g', lw=1,
+                                plt.plot(timeIDs, ac.percentile(comp.inflowRecord,
+                                                                self.system.percentiles[i]), color='g', lw=1,
                                          label=str(self.system.percentiles[i]) + "th perc.")
                         plt.legend(loc=2, fontsize='x-small')
                     plt.savefig(path + "/" + comp.name + " - inflows.png", dpi=300)
@@ -349,21 +350,21 @@ class CSVExporter(object):
                         plt.xlabel('years')
                         plt.ylabel(material + ' in ' + unit)
                         plt.title(capitalizedName + '\nInventory')
-                        for row in comp.inventory:
+                        for row in ac.runValues(comp.inventory):
                             if self.runs == 1:
                                 plt.plot(timeIDs, row, color='0.3', lw=1)
                             else:
                                 plt.plot(timeIDs, row, color='0.7', lw=0.1)
                         if self.runs != 1:
-                            plt.plot(timeIDs, np.mean(comp.inventory, axis=0), color='r',
+                            plt.plot(timeIDs, ac.mean(comp.inventory), color='r',
                                      lw=1, label="mean")
                             if self.system.median:
-                                plt.plot(timeIDs, np.median(comp.inventory, axis=0),
+                                plt.plot(timeIDs, ac.median(comp.inventory),
                                          color='b', lw=1, label="median")
                             if len(self.system.percentiles) != 0:
                                 for i in range(len(self.system.percentiles)):
-                                    plt.plot(timeIDs, np.percentile(comp.inventory,
-                                                                    self.system.percentiles[i], axis=0), color='g', lw=1,
+                                    plt.plot(timeIDs, ac.percentile(comp.inventory,
+                                                                    self.system.percentiles[i]), color='g', lw=1,
                                              label=str(self.system.percentiles[i]) + "th perc.")
                             plt.legend(loc=2, fontsize='x-small')
                         plt.savefig(path + "/" + comp.name + " - inventory.png", dpi=300)
@@ -384,26 +385,35 @@ class CSVExporter(object):
                         plt.xlabel('years')
                         plt.ylabel(material + ' in ' + unit)
                         plt.title(capitalizedName + '\nOutflows')
-                        totalOutflows = np.zeros((self.runs, self.periods))
-                        for i in range(self.runs):
-                            for targ in comp.outflowRecord.keys():
-                                totalOutflows[i] += comp.outflowRecord[targ][i]
-                        if self.runs > 1:
-                            for row in totalOutflows:
-                                plt.plot(timeIDs, row, color='0.7', lw=0.1)
-                            plt.plot(timeIDs, np.mean(totalOutflows, axis=0), color='r',
+                        outflowRecords = list(comp.outflowRecord.values())
+                        if isinstance(outflowRecords[0], ac.RecordStatistics):
+                            # only the statistics of the single outflows are
+                            # known, so only the mean of the total is plotted
+                            plt.plot(timeIDs, sum(ac.mean(record) for record in
+                                                  outflowRecords), color='r',
                                      lw=1, label="mean")
-                            if self.system.median and self.runs != 1:
-                                plt.plot(timeIDs, np.median(totalOutflows, axis=0),
-                                         color='b', lw=1, label="median")
-                            if len(self.system.percentiles) != 0 and self.runs != 1:
-                                for i in range(len(self.system.percentiles)):
-                                    plt.plot(timeIDs, np.percentile(totalOutflows,
-                                                                    self.system.percentiles[i], axis=0), color='g', lw=1,
-                                             label=str(self.system.percentiles[i]) + "th perc.")
                             plt.legend(loc=2, fontsize='x-small')
                         else:
-                            plt.plot(timeIDs, totalOutflows[0], color='0.3', lw=1)
+                            totalOutflows = np.zeros((self.runs, self.periods))
+                            for i in range(self.runs):
+                                for targ in comp.outflowRecord.keys():
+                                    totalOutflows[i] += comp.outflowRecord[targ][i]
+                            if self.runs > 1:
+                                for row in totalOutflows:
+                                    plt.plot(timeIDs, row, color='0.7', lw=0.1)
+                                plt.plot(timeIDs, ac.mean(totalOutflows), color='r',
+                                         lw=1, label="mean")
+                                if self.system.median and self.runs != 1:
+                                    plt.plot(timeIDs, ac.median(totalOutflows),
+                                             color='b', lw=1, label="median")
+                                if len(self.system.percentiles) != 0 and self.runs != 1:
+                                    for i in range(len(self.system.percentiles)):
+                                        plt.plot(timeIDs, ac.percentile(totalOutflows,
+                                                                        self.system.percentiles[i]), color='g', lw=1,
+                                                 label=str(self.system.percentiles[i]) + "th perc.")
+                                plt.legend(loc=2, fontsize='x-small')
+                            else:
+                                plt.plot(timeIDs, totalOutflows[0], color='0.3', lw=1)
                         plt.savefig(path + "/" + comp.name + " - outflows.png", dpi=300)
                         plt.close()
 
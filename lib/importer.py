@@ -13,11 +13,15 @@ modified by kodi in February 2016
 import csv
 from .linker import System, InflowData, RateData, DelayData, SinkData
 from lib.entropy_calculation.conversion import Conversion
+from . import release_kernels as rk
+from .dpmfa_simulator import distributions as ds
 
 
 class CSVImporter(object):
-    def __init__(self):
+    def __init__(self, modelCache = None):
         self.system = System()
+        # lib.model_cache.ModelCache of parsed and built models (optional)
+        self.modelCache = modelCache
 
         self.haveRuns = False
         self.havePeriods = False
@@ -27,6 +31,8 @@ class CSVImporter(object):
         self.haveTimeIndex = False
         self.haveInflow = False
         self.haveEntropy = False
+        self.haveSampling = False
+        self.haveDiscretization = False
 
         self.rowNumber = 1
 
@@ -34,8 +40,11 @@ class CSVImporter(object):
 
         self.supportedTransferTypes = \
             ['inflow', 'delay', 'rate', 'conversion', 'fraction', 'concentration']
-        self.supportedProbabilityDistributions = ['uniform', 'normal', 'triangular']
-        self.supportedReleaseFunctions = ['fix', 'list', 'rand', 'weibull']
+        self.supportedProbabilityDistributions = list(ds.distributions.keys())
+        self.supportedReleaseFunctions = rk.releaseFunctions
+        self.supportedDiscretizations = list(rk.providers.keys())
+        self.supportedSamplingDesigns = ['random', 'lhs', 'sobol',
+                                         'antithetic']
 
         self.concentrationEntropy = dict()
 
@@ -53,6 +62,15 @@ class CSVImporter(object):
             f.seek(0)
             reader = csv.reader(f, dialect)
 
+            modelKey = None
+            if self.modelCache is not None:
+                rows = list(reader)
+                reader = rows
+                modelKey = self.modelCache.key(rows)
+                cached = self.modelCache.load(modelKey, 'source')
+                if cached is not None:
+                    return self.loadCached(cached, rows, modelKey)
+
             # go through every line of the input file and make sanity checks and get data
             for row in reader:
 
@@ -73,6 +91,10 @@ class CSVImporter(object):
                     continue
                 if self.checkForEntropyHmax(row):
                     continue
+                if self.checkForSampling(row):
+                    continue
+                if self.checkForDiscretization(row):
+                    continue
 
                 metadata, description, values = self.checkNumberOfColumns(row)
 
@@ -96,8 +118,31 @@ class CSVImporter(object):
             # delayed releases or neither delayed releases nor transfers.
             self.delayToRateSink()
 
+            if self.modelCache is not None:
+                self.modelCache.store(modelKey, 'source',
+                                      (self.system, self.concentrationEntropy))
+                self.system.modelCache = self.modelCache
+                self.system.modelKey = modelKey
+
             return self.system, self.concentrationEntropy
 
+    def loadCached(self, cached, rows, modelKey):
+        # use the system parsed from a file with the same rows, with the runs
+        # of the current file
+        self.system, self.concentrationEntropy = cached
+        defaults = System()
+        self.system.runs = defaults.runs
+        self.system.tolerance = defaults.tolerance
+        for row in rows:
+            if not row or len(row[0]) == 0:
+                self.rowNumber += 1
+                continue
+            self.checkForRuns(row)
+            break
+        self.system.modelCache = self.modelCache
+        self.system.modelKey = modelKey
+        return self.system, self.concentrationEntropy
+
     # check and log input for 'runs'
     def checkForRuns(self, row):
         if not self.haveRuns:
@@ -107,6 +152,8 @@ class CSVImporter(object):
                         ("row %d, col %s: is empty.\n" +
                          "Please enter an integer > 0.")
                         % (self.rowNumber, self.colString(1)))
+                elif row[1].strip().lower() == "auto":
+                    self.checkForAdaptiveRuns(row)
                 else:
                     try:
                         self.system.runs = int(row[1])
@@ -134,6 +181,34 @@ class CSVImporter(object):
             return True
         return False
 
+    # check and log the tolerance and the maximum number of runs for 'runs: auto'
+    def checkForAdaptiveRuns(self, row):
+        self.system.tolerance = 0.01
+        self.system.runs = 100000
+        if len(row) > 2 and len(row[2]) != 0:
+            try:
+                self.system.tolerance = float(row[2])
+            except ValueError:
+                self.system.tolerance = -1
+            if not 0 < self.system.tolerance < 1:
+                raise CSVParserException(
+                    ("row %d, col %s:\nThe input '%s' is not a valid " +
+                     "tolerance.\nWith 'auto' runs, enter the relative " +
+                     "precision of the results as a number between 0 and 1 " +
+                     "(e.g. '0.01' for 1%%) and optionally the maximum number " +
+                     "of runs into the next column.")
+                    % (self.rowNumber, self.colString(2), row[2]))
+        if len(row) > 3 and len(row[3]) != 0:
+            try:
+                self.system.runs = int(row[3])
+            except ValueError:
+                self.system.runs = 0
+            if self.system.runs < 1:
+                raise CSVParserException(
+                    ("row %d, col %s:\nThe input '%s' is not a valid " +
+                     "maximum number of runs.\nPlease enter an integer > 0.")
+                    % (self.rowNumber, self.colString(3), row[3]))
+
     # check and log input for 'periods'
     def checkForPeriods(self, row):
         if not self.havePeriods:
@@ -567,33 +642,8 @@ class CSVImporter(object):
                              "float values as parameters for the chosen function.")
                             % (self.rowNumber, self.colString(self.valuesOffset + c),
                                tempArg[2]))
-                    if tempArg[1] == "normal" and len(tempArg[2]) != 2:
-                        raise CSVParserException(
-                            ("row %d, col %s:\nWrong number of function " +
-                             "parameters for function 'normal', got input '%s'. " +
-                             "Please choose exactly two floats as parameters, " +
-                             "got %d parameters.\n" +
-                             "-> example input: 'stoch|normal|3000, 120'")
-                            % (self.rowNumber, self.colString(self.valuesOffset + c),
-                               tempArg[2], len(tempArg[2])))
-                    if tempArg[1] == "triangular" and len(tempArg[2]) != 3:
-                        raise CSVParserException(
-                            ("row %d, col %s:\nWrong number of function " +
-                             "parameters for function 'triangular', got input " +
-                             "'%s'. Please choose exactly three floats as " +
-                             "parameters, got %d parameters.\n-> example input: " +
-                             "'stoch|triangular|2880, 3000, 3120'")
-                            % (self.rowNumber, self.colString(self.valuesOffset + c),
-                               tempArg[2], len(tempArg[2])))
-                    if tempArg[1] == "uniform" and len(tempArg[2]) != 2:
-                        raise CSVParserException(
-                            ("row %d, col %s:\nWrong number of function " +
-                             "parameters for function 'uniform', got input '%s'. " +
-                             "Please choose exactly two floats as parameters, " +
-                             "got %d parameters.\n" +
-                             "-> example input: 'stoch|uniform|2880, 3120'")
-                            % (self.rowNumber, self.colString(self.valuesOffset + c),
-                               tempArg[2], len(tempArg[2])))
+                    self.checkDistributionParameters(tempArg[1], tempArg[2],
+                                                     c, "")
                 elif tempArg[0] == "rand":
                     if len(tempArg) > 2:
                         raise CSVParserException(
@@ -728,9 +778,12 @@ class CSVImporter(object):
                              "float values as parameters for the chosen function.")
                             % (self.rowNumber, self.colString(self.valuesOffset + c),
                                tempArg[2]))
+                    self.checkDistributionParameters(tempArg[1], tempArg[2],
+                                                     c, "|1")
+                    values = self.valueParameters(tempArg[1], tempArg[2])
                     if transferType == "fraction" or transferType == "rate":
-                        for i in range(len(tempArg[2])):
-                            if tempArg[2][i] > 1.0 or tempArg[2][i] < 0:
+                        for value in values:
+                            if value > 1.0 or value < 0:
                                 raise CSVParserException(
                                     ("\n--------------------\n" +
                                      "row %d, col %s:\nRates or parameters are bigger " +
@@ -739,8 +792,8 @@ class CSVImporter(object):
                                     % (self.rowNumber, self.colString(self.valuesOffset + c),
                                        tempArg[2]))
                     if transferType == "conversion":
-                        for i in range(len(tempArg[2])):
-                            if tempArg[2][i] < 0:
+                        for value in values:
+                            if value < 0:
                                 raise CSVParserException(
                                     ("\n--------------------\n" +
                                      "row %d, col %s:\nRates or parameters are " +
@@ -958,8 +1011,10 @@ class CSVImporter(object):
                              "float values as parameters for the chosen function.")
                             % (self.rowNumber, self.colString(self.valuesOffset + c),
                                tempArg[2]))
-                    for i in range(len(tempArg[2])):
-                        if tempArg[2][i] > 1.0 or tempArg[2][i] < 0:
+                    self.checkDistributionParameters(tempArg[1], tempArg[2],
+                                                     c, "|1|list|0.5, 0.3, 0.2|0")
+                    for value in self.valueParameters(tempArg[1], tempArg[2]):
+                        if value > 1.0 or value < 0:
                             raise CSVParserException(
                                 ("\n--------------------\n" +
                                  "row %d, col %s:\nRates or parameters are bigger " +
@@ -1129,7 +1184,7 @@ class CSVImporter(object):
             self.system.nodes[nodeName] = "inflow"
             self.system.inflows[nodeName] = InflowData(nodeName, dst, dstMaterial,
                                                        dstUnit, splittedValues,
-                                                       description)
+                                                       description, src)
         elif transferType == "delay":
             if nodeName not in self.system.nodes:
                 self.system.nodes[nodeName] = "delay"
@@ -1357,6 +1412,72 @@ class CSVImporter(object):
             return True
         return False
 
+    # check the parameters of a 'stoch' value with the registry of the
+    # probability distributions; 'suffix' follows the parameters in the
+    # example input
+    def checkDistributionParameters(self, function, parameters, c, suffix):
+        try:
+            ds.checkParameters(function, parameters)
+        except ValueError as e:
+            raise CSVParserException(
+                ("row %d, col %s:\nWrong function parameters for function " +
+                 "'%s', got input '%s'. %s\n" +
+                 "-> example input: 'stoch|%s|%s%s'")
+                % (self.rowNumber, self.colString(self.valuesOffset + c),
+                   function, ", ".join(str(p) for p in parameters), e,
+                   function, ds.distributions[function].example, suffix))
+
+    # the parameters of a 'stoch' value in the unit of the values (e.g.
+    # locations and bounds), without the shape parameters
+    def valueParameters(self, function, parameters):
+        return [parameters[i] for i in 
+                ds.distributions[function].valueParameters 
+                if i < len(parameters)]
+
+    # check and log the optional input for 'sampling'
+    def checkForSampling(self, row):
+        if not self.haveSampling and \
+           row[0].lower().replace(" ", "") == "sampling:":
+            design = row[1].strip().lower()
+            if len(design) == 0:
+                design = "random"
+            if design not in self.supportedSamplingDesigns:
+                raise CSVParserException(
+                    ("row %d, col %s:\nUnknown sampling design, got '%s'.\n" +
+                     "Please enter one of %s or leave the cell empty for " +
+                     "random sampling.")
+                    % (self.rowNumber, self.colString(1), row[1],
+                       ", ".join(self.supportedSamplingDesigns)))
+            self.system.sampling = design
+
+            self.rowNumber += 1
+            self.haveSampling = True
+            return True
+        return False
+
+    # check and log the optional input for 'discretization' (the provider of
+    # the release kernels)
+    def checkForDiscretization(self, row):
+        if not self.haveDiscretization and \
+           row[0].lower().replace(" ", "") == "discretization:":
+            provider = row[1].strip().lower()
+            if len(provider) == 0:
+                provider = "extended"
+            if provider not in self.supportedDiscretizations:
+                raise CSVParserException(
+                    ("row %d, col %s:\nUnknown discretization of the " +
+                     "release functions, got '%s'.\nPlease enter one of %s " +
+                     "or leave the cell empty for the extended " +
+                     "discretization.")
+                    % (self.rowNumber, self.colString(1), row[1],
+                       ", ".join(self.supportedDiscretizations)))
+            self.system.releaseProvider = provider
+
+            self.rowNumber += 1
+            self.haveDiscretization = True
+            return True
+        return False
+
 
 class CSVParserException(Exception):
     def __init__(self, error):
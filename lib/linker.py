@@ -12,30 +12,32 @@ Then it sets the dpmfa model and runs the simulator.
 
 
 
-from copy import copy, deepcopy
 import numpy as np
 from .dpmfa_simulator import simulator as sim
 from .dpmfa_simulator import model as model
 from .dpmfa_simulator import components as cp
+from .dpmfa_simulator import distributions as ds
 from . import adjusted_functions_ExtDiskret as af
+from . import release_kernels as rk
 
 
 
 class NodeData(object):
   def __init__(self, nodeName, material, unit):
-    self.name = copy(nodeName)
-    self.material = copy(material)
-    self.unit = copy(unit)
+    self.name = nodeName
+    self.material = material
+    self.unit = unit
     self.type = "no type"
 
 
 class InflowData(NodeData):
   def __init__(self, nodeName, dstName, material, unit, inflows = [],
-               description = ''):
+               description = '', source = ''):
     super(InflowData, self).__init__(nodeName, material, unit)
-    self.target = deepcopy(dstName + '_' + material + '_' + unit)
-    self.inflows = deepcopy(inflows)
-    self.description = copy(description)
+    self.target = dstName + '_' + material + '_' + unit
+    self.inflows = list(inflows)
+    self.description = description
+    self.source = source  # the source column of the inflow row
     self.type = "inflow"
   
   
@@ -43,10 +45,10 @@ class RateData(NodeData):
   def __init__(self, nodeName, material, unit, nodeType = "no type",
                transfers = {}, descriptions = {}):
     super(RateData, self).__init__(nodeName, material, unit)
-    self.name = deepcopy(nodeName + '_' + material + '_' + unit)
-    self.category = copy(nodeName)
-    self.transfers = deepcopy(transfers)
-    self.descriptions = copy(descriptions)
+    self.name = nodeName + '_' + material + '_' + unit
+    self.category = nodeName
+    self.transfers = dict(transfers)
+    self.descriptions = dict(descriptions)
     self.type = nodeType  # later defined as 'conversion', 'fraction' or 'rate'
 
 
@@ -54,19 +56,19 @@ class DelayData(NodeData):
   def __init__(self, nodeName, material, unit, transfers = {},
                releases = {}, descriptions = {}):
     super(DelayData, self).__init__(nodeName, material, unit)
-    self.name = deepcopy(nodeName + '_' + material + '_' + unit)
-    self.category = copy(nodeName)
-    self.transfers = deepcopy(transfers)
-    self.releases = deepcopy(releases)
-    self.descriptions = copy(descriptions)
+    self.name = nodeName + '_' + material + '_' + unit
+    self.category = nodeName
+    self.transfers = dict(transfers)
+    self.releases = dict(releases)
+    self.descriptions = dict(descriptions)
     self.type = "delay"
 
 
 class SinkData(NodeData):
   def __init__(self, nodeName, material, unit):
     super(SinkData, self).__init__(nodeName, material, unit)
-    self.name = deepcopy(nodeName + '_' + material + '_' + unit)
-    self.category = copy(nodeName)
+    self.name = nodeName + '_' + material + '_' + unit
+    self.category = nodeName
 
 class System(object):
   def __init__(self):
@@ -83,14 +85,30 @@ class System(object):
     self.sinks = {}
     self.links = []
     self.entropy = False
+    self.seed = 1  # seed of the random streams of the simulation
+    self.engine = "loop"
+    self.solver = "dense"
+    self.solverTolerance = None  # precision of the iterative solver
+    self.solverBlockSize = None  # smallest loop the iterative solver iterates
+    self.workers = 1
+    self.recordDirectory = None
+    self.streaming = False
+    self.tolerance = None  # relative precision of the adaptive run count
+    self.precision = None
+    self.sampling = "random"
+    # random streams keyed by the links (comparison of model variants)
+    self.commonRandomNumbers = False
+    self.releaseProvider = "extended"  # discretization of the releases
+    self.modelCache = None  # lib.model_cache.ModelCache of the built model
+    self.modelKey = None
 
     self.Hmax = -99
     self.metadataMatrix = []
     self.entropyInflows = []
     
 
-  def run(self):
-    """Runs the dpmfa simulator with the gathered data."""
+  def buildModel(self):
+    """Creates the dpmfa model out of the gathered data."""
     
     print('\n               creating model...')
     print('0%                                              100%')
@@ -105,18 +123,17 @@ class System(object):
     self.parametersDict = {}
     self.prioritiesDict = {}
 
-    # create flow compartments, stocks and sinks out of the gathered data
-    for node in list(self.rates.keys()):
+    # create flow compartments, stocks and sinks out of the gathered data;
+    # every compartment gets new lists for its transfers and releases
+    for node in self.rates:
       if self.rates[node].type in ["rate", "fraction"]:
-        newCompartment = \
-        cp.FlowCompartment(node, logInflows=True, logOutflows=True,
+        self.dpmfaCompartments[node] = \
+        cp.FlowCompartment(node, [], logInflows=True, logOutflows=True,
                 adjustOutgoingTCs=True, categories=[self.rates[node].category])
-        self.dpmfaCompartments[node] = deepcopy(newCompartment)
       elif self.rates[node].type == "conversion":
-        newCompartment = \
-        cp.FlowCompartment(node, logInflows=True, logOutflows=True,
+        self.dpmfaCompartments[node] = \
+        cp.FlowCompartment(node, [], logInflows=True, logOutflows=True,
                adjustOutgoingTCs=False, categories=[self.rates[node].category])
-        self.dpmfaCompartments[node] = deepcopy(newCompartment)
       else:
         raise RunException(
               ("\n--------------------\n" +
@@ -125,12 +142,11 @@ class System(object):
                % (self.rates[node].type))
 
     print("|", end="")  # displays progress step 1
-    for node in list(self.delays.keys()):
+    for node in self.delays:
       if self.delays[node].type == "delay":
-        newStock = \
-        cp.TDRStock(node, logInflows=True, logOutflows=True,
+        self.dpmfaCompartments[node] = \
+        cp.TDRStock(node, [], [], logInflows=True, logOutflows=True,
                     categories=[self.delays[node].category])
-        self.dpmfaCompartments[node] = deepcopy(newStock)
       else:
         raise RunException(
               ("\n--------------------\n" +
@@ -138,16 +154,17 @@ class System(object):
                "Only type 'delay' is allowed.")
                % (self.delays[node].type))
 
-    for node in list(self.sinks.keys()):
-      newSink = \
+    for node in self.sinks:
+      self.dpmfaCompartments[node] = \
       cp.Sink(node, logInflows=True, categories=[self.sinks[node].category])
-      self.dpmfaCompartments[node] = deepcopy(newSink)
       
-    # create and log external inflows to the system
+    # create and log external inflows to the system; their link identifiers
+    # do not depend on the numbers of the inflow nodes, which follow the order
+    # of the rows (see checkInflowLinks)
     for node in list(self.inflows.keys()):
       srcNode = self.inflows[node]
       targ = srcNode.target
-      if targ not in list(self.dpmfaCompartments.keys()):
+      if targ not in self.dpmfaCompartments:
         raise RunException(
               ("\n--------------------\n" +
                "ERROR:\nTarget node for inflow not found.\ninflow: %s\n" +
@@ -159,18 +176,11 @@ class System(object):
           self.dpmfaSinglePeriodInflows[node].append(
                                     cp.FixedValueInflow(srcNode.inflows[i][1]))
         elif srcNode.inflows[i][0] == "stoch":
-          if srcNode.inflows[i][1] == "normal":
+          if srcNode.inflows[i][1] in ds.distributions:
             self.dpmfaSinglePeriodInflows[node].append(
-                            cp.StochasticFunctionInflow(np.random.normal,
-                                                        srcNode.inflows[i][2]))
-          elif srcNode.inflows[i][1] == "triangular":
-            self.dpmfaSinglePeriodInflows[node].append(
-                            cp.StochasticFunctionInflow(np.random.triangular,
-                                                        srcNode.inflows[i][2]))
-          elif srcNode.inflows[i][1] == "uniform":
-            self.dpmfaSinglePeriodInflows[node].append(
-                            cp.StochasticFunctionInflow(np.random.uniform,
-                                                        srcNode.inflows[i][2]))
+                            cp.StochasticFunctionInflow(
+                            ds.distributions[srcNode.inflows[i][1]].sample,
+                            srcNode.inflows[i][2]))
           else:
             raise RunException(
                   ("\n--------------------\n" +
@@ -188,6 +198,7 @@ class System(object):
       self.dpmfaListInflows.append(cp.ExternalListInflow(
                     self.dpmfaCompartments[targ],
                     list(inf for inf in self.dpmfaSinglePeriodInflows[node])))
+      self.dpmfaListInflows[-1].linkId = self.inflowLinkId(srcNode)
 
 
     # create transfers for 'rate' nodes (incl. 'conversion' + 'fraction' nodes)
@@ -198,7 +209,7 @@ class System(object):
         self.functionsDict[node, targ] = []
         self.parametersDict[node, targ] = []
         self.prioritiesDict[node, targ] = []
-        if targ in list(self.dpmfaCompartments.keys()):
+        if targ in self.dpmfaCompartments:
             
           for i in range(len(srcNode.transfers[targ])):
             if srcNode.transfers[targ][i][0] == "fix":
@@ -208,12 +219,9 @@ class System(object):
               self.prioritiesDict[node, targ].append(
                                                  srcNode.transfers[targ][i][2])
             elif srcNode.transfers[targ][i][0] == "stoch":
-              if srcNode.transfers[targ][i][1] == "normal":
-                self.functionsDict[node, targ].append(np.random.normal)
-              elif srcNode.transfers[targ][i][1] == "triangular":
-                self.functionsDict[node, targ].append(np.random.triangular)
-              elif srcNode.transfers[targ][i][1] == "uniform":
-                self.functionsDict[node, targ].append(np.random.uniform)
+              if srcNode.transfers[targ][i][1] in ds.distributions:
+                self.functionsDict[node, targ].append(
+                      ds.distributions[srcNode.transfers[targ][i][1]].sample)
               else:
                 raise RunException(
                       ("\n--------------------\n" +
@@ -251,6 +259,7 @@ class System(object):
                                  self.functionsDict[node, targ],
                                  self.parametersDict[node, targ],
                                  self.prioritiesDict[node, targ])
+        newTransfer.linkId = self.linkId(node, targ)
         
         self.dpmfaCompartments[node].transfers.append(newTransfer)
         newTransfer = None
@@ -264,14 +273,21 @@ class System(object):
     for node in list(self.delays.keys()):  # calculation of the number of steps
       srcNode = self.delays[node]
       for targ in list(srcNode.transfers.keys()):
-        if targ in list(self.dpmfaCompartments.keys()):
+        if targ in self.dpmfaCompartments:
           totalSteps += 2
           
+    # release rates are shared by all releases with the same release function
+    releaseKernelTable = cp.ReleaseKernelTable()
+    # random release rates are drawn from a stream of the seed, the spawn key
+    # separates it from the streams of the simulator
+    releaseRandom = np.random.Generator(np.random.Philox(
+        np.random.SeedSequence(self.seed, spawn_key=(2**32 + 2,))))
+
     # create transfers and release strategies for 'delay' nodes
     for node in list(self.delays.keys()):
       srcNode = self.delays[node]
       for targ in list(srcNode.transfers.keys()):
-        if targ in list(self.dpmfaCompartments.keys()):
+        if targ in self.dpmfaCompartments:
             
           if len(srcNode.transfers[targ]) != len(srcNode.releases[targ]):
             raise RunException(
@@ -284,6 +300,7 @@ class System(object):
           priorityList = []
           releaseFunctionList = []
           delayList = []
+          releaseKeys = []
 
           # create and log transfers and releases for every period
           for i in range(len(srcNode.transfers[targ])):
@@ -293,12 +310,9 @@ class System(object):
               parameterList.append(srcNode.transfers[targ][i][1])
               priorityList.append(srcNode.transfers[targ][i][2])
             elif srcNode.transfers[targ][i][0] == "stoch":
-              if srcNode.transfers[targ][i][1] == "normal":
-                functionList.append(np.random.normal)
-              elif srcNode.transfers[targ][i][1] == "triangular":
-                functionList.append(np.random.triangular)
-              elif srcNode.transfers[targ][i][1] == "uniform":
-                functionList.append(np.random.uniform)
+              if srcNode.transfers[targ][i][1] in ds.distributions:
+                functionList.append(
+                      ds.distributions[srcNode.transfers[targ][i][1]].sample)
               else:
                 raise RunException(
                       ("\n--------------------\n" +
@@ -320,32 +334,37 @@ class System(object):
 
             # create and log releases      
             releaseParameters = srcNode.releases[targ][i][1]
-            if srcNode.releases[targ][i][0] == "fix":
-              releaseFunctionList.append(
-                      af.ReleaseFunction(releaseParameters).fixedRateRelease)
-            elif srcNode.releases[targ][i][0] == "list":
-              releaseFunctionList.append(
-                      af.ReleaseFunction(releaseParameters).listRelease)
-            elif srcNode.releases[targ][i][0] == "rand":
-              releaseFunctionList.append(
-                      af.ReleaseFunction(releaseParameters).randomRateRelease)
-            elif srcNode.releases[targ][i][0] == "weibull":
-              releaseFunctionList.append(
-                          af.ReleaseFunction(releaseParameters).weibullRelease)
-            else:
+            if srcNode.releases[targ][i][0] not in \
+               rk.providers[self.releaseProvider]:
               raise RunException(
                     ("\n--------------------\n" +
                      "ERROR:\nUnexpected release function, got '%s'.\n" +
                      "link: '%s' -> '%s'")
                      % (srcNode.releases[targ][i][0], node, targ))
+            try:
+              releaseFunctionList.append(rk.releaseKernel(
+                      self.releaseProvider, srcNode.releases[targ][i][0],
+                      releaseParameters, releaseRandom))
+            except ValueError as e:
+              raise RunException(
+                    ("\n--------------------\n" +
+                     "ERROR:\n%s\nlink: '%s' -> '%s'") % (e, node, targ))
             # log delay
             delayList.append(srcNode.releases[targ][i][2])
+            # random release rates are drawn for every period on their own
+            if srcNode.releases[targ][i][0] == "rand":
+              releaseKeys.append(None)
+            else:
+              releaseKeys.append((srcNode.releases[targ][i][0],
+                                  tuple(releaseParameters), delayList[-1]))
 
 
           # append the transfers to the compartments
           self.dpmfaCompartments[node].transfers.append(
                          cp.PeriodDefinedTransfer(self.dpmfaCompartments[targ],
                          functionList, parameterList, priorityList))
+          self.dpmfaCompartments[node].transfers[-1].linkId = \
+          self.linkId(node, targ)
 
           # print progress
           if signsToPrint != 0 and currentStep+1-lastIncrease >= float(totalSteps)/signsToPrint:
@@ -359,7 +378,8 @@ class System(object):
           # append the releases to the compartments
           self.dpmfaCompartments[node].localReleaseList.append(
                           cp.PeriodDefinedRelease(self.dpmfaCompartments[targ],
-                          releaseFunctionList, delayList))
+                          releaseFunctionList, delayList, releaseKeys,
+                          releaseKernelTable))
                           
           # print progress
           if signsToPrint != 0 and currentStep+1-lastIncrease >= float(totalSteps)/signsToPrint:
@@ -383,7 +403,7 @@ class System(object):
 
     # add compartments and inflows to the model
     compartmentList = []
-    for n in list(self.dpmfaCompartments.keys()):
+    for n in self.dpmfaCompartments:
       compartmentList.append(self.dpmfaCompartments[n])
 
     dpmfaModel.setCompartments(compartmentList)  
@@ -391,9 +411,79 @@ class System(object):
     dpmfaModel.setInflows(self.dpmfaListInflows)
 
     dpmfaModel.checkModelValidity()
+
+    return dpmfaModel
+
+
+  def linkId(self, source, target):
+    """Returns the identifier of a link, its source and target node with
+    material and unit as in the rows of the metadataMatrix."""
+    return source + " -> " + target
+
+
+  def inflowLinkId(self, inflow):
+    """Returns the identifier of the link of an inflow from its source,
+    description and target, which unlike the name of the inflow node do not
+    depend on the order of the inflow rows."""
+    return self.linkId("inflow " + inflow.source + " (" + 
+                       inflow.description + ")", inflow.target)
+
+
+  def checkInflowLinks(self):
+    """Raises a RunException, if two inflows have the same link identifier,
+    so common random numbers would draw the same values for both."""
+    inflowLinks = {}
+    for node in list(self.inflows.keys()):
+      linkId = self.inflowLinkId(self.inflows[node])
+      if linkId in inflowLinks:
+        raise RunException(
+              ("\n--------------------\n" +
+               "ERROR:\nThe inflows '%s' and '%s' have the same source, " +
+               "description and target, which common random numbers cannot " +
+               "tell apart. Please give them different sources or " +
+               "descriptions.\ntarget node: %s")
+               % (inflowLinks[linkId], node, self.inflows[node].target))
+      inflowLinks[linkId] = node
+
+
+  def hasRandomReleases(self):
+    """Returns True, if a release function draws its rates at random."""
+    return any(release[0] == "rand" for srcNode in self.delays.values() 
+               for releases in srcNode.releases.values()
+               for release in releases)
+
+
+  def run(self):
+    """Runs the dpmfa simulator with the gathered data."""
+
+    # checked on every run, cached models are not built again
+    if self.commonRandomNumbers:
+      self.checkInflowLinks()
+
+    dpmfaModel = None
+    if self.modelCache is not None:
+      dpmfaModel = self.modelCache.load(self.modelKey, 'model')
+    if dpmfaModel is None:
+      dpmfaModel = self.buildModel()
+      # random release rates are drawn for every new model
+      if self.modelCache is not None and not self.hasRandomReleases():
+        self.modelCache.store(self.modelKey, 'model', dpmfaModel)
+    else:
+      print('\nusing the cached model')
     
     # create the dpmfa simulator
-    simulator = sim.Simulator(self.runs, self.periods, 1, False, True)
+    simulator = sim.Simulator(self.runs, self.periods, self.seed, False, True,
+                              self.engine, solver=self.solver,
+                              workers=self.workers,
+                              recordDirectory=self.recordDirectory,
+                              streaming=self.streaming,
+                              tolerance=self.tolerance,
+                              trackedPercentiles=self.percentiles +
+                                                 ([50] if self.median else []),
+                              sampling=self.sampling,
+                              solverTolerance=self.solverTolerance,
+                              solverBlockSize=self.solverBlockSize,
+                              commonRandomNumbers=self.commonRandomNumbers)
     
     # connect the dpmfa model to the simulator
     simulator.setModel(dpmfaModel)
@@ -401,6 +491,10 @@ class System(object):
     # run Monte-Carlo simulation process
     simulator.runSimulation()
 
+    # the adaptive mode determines the number of runs itself
+    self.runs = simulator.numRuns
+    self.precision = simulator.precision
+
     self.entropyInflows = dpmfaModel.getInflows()
     
     return simulator
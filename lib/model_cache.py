@@ -0,0 +1,157 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+"""
+Created in October 2026
+
+The model_cache module keeps parsed and built models on disk, so a source
+file that was already analysed is neither parsed nor built again.
+
+An entry is keyed by a hash of the rows of the source file and the cache
+version. The 'runs:' row is not part of the key: a source file that only
+differs in the number of runs uses the cached model, with the runs of the
+file. Two kinds of entries are stored for a key: the parsed System of the
+importer ('source') and the dpmfa model the System builds from it ('model').
+"""
+
+import hashlib
+import os
+import pickle
+import tempfile
+import numpy as np
+from .dpmfa_simulator import components as cp
+
+
+# increase whenever the importer or the linker build something different from
+# the same source file, so old entries are not used anymore
+version = 9
+
+
+class ModelCache(object):
+    """ Stores and loads the entries of a cache directory.
+
+    Parameters:
+    ----------------
+    directory: string
+        the directory of the cache files, created if it does not exist
+    """
+    def __init__(self, directory):
+        self.directory = directory
+
+
+    def key(self, rows):
+        """ returns the key of a source file
+
+        Parameters:
+        ----------------
+        rows: list<list<string>>
+            the rows of the source file as read by the csv reader
+        """
+        digest = hashlib.sha256(('dpmfa model cache %d\n' % version).encode())
+        for row in rows:
+            if row and row[0].lower() == "runs:":
+                continue
+            digest.update(('\x1f'.join(row) + '\x1e').encode('utf-8'))
+        return digest.hexdigest()
+
+
+    def load(self, key, kind):
+        """ returns the cached entry of a kind for a key, None if there is no
+        usable entry
+        """
+        try:
+            with open(self.__fileName(key, kind), 'rb') as f:
+                return ModelUnpickler(f).loadAll()
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print('ignoring unreadable model cache entry %s (%s)'
+                  % (self.__fileName(key, kind), e))
+            return None
+
+
+    def store(self, key, kind, value):
+        """ stores an entry of a kind for a key; the file is replaced at
+        once, so concurrent runs never read a partly written entry
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        handle, tempName = tempfile.mkstemp(dir=self.directory,
+                                            prefix='entry_')
+        try:
+            with os.fdopen(handle, 'wb') as f:
+                ModelPickler(f, pickle.HIGHEST_PROTOCOL).dumpAll(value)
+            os.replace(tempName, self.__fileName(key, kind))
+        except Exception:
+            os.remove(tempName)
+            raise
+
+
+    def __fileName(self, key, kind):
+        return os.path.join(self.directory, '%s.%s' % (key, kind))
+
+
+
+class ModelPickler(pickle.Pickler):
+    """ Pickles a value that contains model compartments.
+
+    The compartments of a model reference each other through their transfers
+    and releases; pickled as usual, a long chain of compartments exceeds the
+    recursion limit. Compartments are therefore pickled as references, and
+    the state of every referenced compartment is pickled as a record of its
+    own after the value.
+    The sampling functions of the global numpy random stream (e.g.
+    numpy.random.normal) are pickled by name, so they are bound to the
+    global stream again when they are loaded.
+    """
+    def __init__(self, *args, **kwargs):
+        super(ModelPickler, self).__init__(*args, **kwargs)
+        self.compartments = []
+        self.compartmentIndices = {}  # Dict {id(Compartment): index}
+
+    def persistent_id(self, obj):
+        if isinstance(obj, cp.Compartment):
+            if id(obj) not in self.compartmentIndices:
+                self.compartmentIndices[id(obj)] = len(self.compartments)
+                self.compartments.append(obj)
+            return ('compartment', self.compartmentIndices[id(obj)],
+                    type(obj))
+        if getattr(obj, '__self__', None) is np.random.mtrand._rand:
+            return ('numpy.random', obj.__name__)
+        return None
+
+    def dumpAll(self, value):
+        """ pickles the value and the states of all its compartments """
+        self.dump(value)
+        stored = 0
+        while stored < len(self.compartments):
+            self.dump(self.compartments[stored].__dict__)
+            stored += 1
+
+
+
+class ModelUnpickler(pickle.Unpickler):
+    """ Loads a value pickled by ModelPickler """
+    def __init__(self, *args, **kwargs):
+        super(ModelUnpickler, self).__init__(*args, **kwargs)
+        self.compartments = []
+
+    def persistent_load(self, pid):
+        if pid[0] == 'compartment':
+            index, compartmentClass = pid[1:]
+            while len(self.compartments) <= index:
+                self.compartments.append(None)
+            if self.compartments[index] is None:
+                self.compartments[index] = \
+                    compartmentClass.__new__(compartmentClass)
+            return self.compartments[index]
+        if pid[0] == 'numpy.random':
+            return getattr(np.random, pid[1])
+        raise pickle.UnpicklingError('unknown persistent id %r' % (pid,))
+
+    def loadAll(self):
+        """ loads the value and the states of all its compartments """
+        value = self.load()
+        loaded = 0
+        while loaded < len(self.compartments):
+            self.compartments[loaded].__dict__.update(self.load())
+            loaded += 1
+        return value
@@ -0,0 +1,167 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+"""
+Created in October 2026
+
+The release_kernels module contains the providers of release kernels for the
+delayed releases of stocks. A release kernel is the array of the release
+rates of a stored amount in the periods after its storage, starting with the
+immediate release (period 0), like the rates the functions of the class
+'ReleaseFunction' return period by period.
+
+A provider is one discretization of the release functions and maps the name
+of every release function ('fix', 'list', 'rand', 'weibull', 'lognormal',
+'gamma', 'exponential') to a function kernel(parameters, length) that returns
+the rates of the periods 0 to length-1 as one array:
+
+    extended   weibull rates of adjusted_functions_ExtDiskret (default)
+    simple     weibull density at full periods, like
+               extra_adjfunctions/adjusted_functions_SimpleDiskret
+    dweibull   double weibull density at full periods with the parameters
+               (c, loc, scale), like extra_adjfunctions/adjusted_functions
+
+The lifetime distributions lognormal, gamma and exponential are the same for
+all providers: the rate of a period is the probability of a lifetime within
+half a period around it, period 0 covers the lifetimes below 0.5.
+"""
+
+import numpy as np
+import scipy.stats as st
+from . import adjusted_functions_ExtDiskret as af
+
+
+# maximum number of periods of a release, see components.releaseRates
+maxLength = 500
+
+
+def fixedKernel(parameters, length = maxLength):
+    """ the first parameter is released in every period """
+    return np.full(length, float(parameters[0]))
+
+
+def listKernel(parameters, length = maxLength):
+    """ the parameters are the rates of the first periods """
+    kernel = np.zeros(max(length, len(parameters)))
+    kernel[:len(parameters)] = parameters
+    return kernel[:length]
+
+
+def randomKernel(parameters, length = maxLength, random = np.random):
+    """ a random choice of the parameters is released in every period. The
+    rates are drawn period by period from the random stream 'random' (the
+    global numpy random stream or a numpy Generator) until all material is
+    released, like ReleaseFunction.randomRateRelease draws them.
+    """
+    rates = []
+    while sum(rates) < 1 and len(rates) < length:
+        rates.append(random.choice(parameters))
+    return np.array(rates, dtype=float)
+
+
+def extendedWeibullKernel(parameters, length = maxLength):
+    """ discretized weibull rates with the parameters (c, scale[, loc]) """
+    __checkParameters('weibull', parameters, 2, 3)
+    kernel = af.weibullKernel(*parameters)
+    return kernel[:length]
+
+
+def simpleWeibullKernel(parameters, length = maxLength):
+    """ weibull density at full periods with the parameters (c, scale[, loc])
+    """
+    __checkParameters('weibull', parameters, 2, 3)
+    loc = parameters[2] if len(parameters) == 3 else 0
+    return st.exponweib(1, parameters[0], loc, parameters[1]).pdf(
+                                                          np.arange(length))
+
+
+def doubleWeibullKernel(parameters, length = maxLength):
+    """ double weibull density at full periods with the parameters
+    (c, loc[, scale])
+    """
+    __checkParameters('weibull', parameters, 2, 3)
+    return st.dweibull(*parameters).pdf(np.arange(length))
+
+
+def lognormalKernel(parameters, length = maxLength):
+    """ lognormal lifetimes with the parameters (s, scale[, loc]) """
+    __checkParameters('lognormal', parameters, 2, 3)
+    loc = parameters[2] if len(parameters) == 3 else 0
+    return __lifetimeRates(st.lognorm(parameters[0], loc, parameters[1]),
+                           length)
+
+
+def gammaKernel(parameters, length = maxLength):
+    """ gamma lifetimes with the parameters (a, scale[, loc]) """
+    __checkParameters('gamma', parameters, 2, 3)
+    loc = parameters[2] if len(parameters) == 3 else 0
+    return __lifetimeRates(st.gamma(parameters[0], loc, parameters[1]),
+                           length)
+
+
+def exponentialKernel(parameters, length = maxLength):
+    """ exponential lifetimes with the parameters (scale[, loc]) """
+    __checkParameters('exponential', parameters, 1, 2)
+    loc = parameters[1] if len(parameters) == 2 else 0
+    return __lifetimeRates(st.expon(loc, parameters[0]), length)
+
+
+def __lifetimeRates(distribution, length):
+    """ returns the probabilities of the lifetimes in [period - 0.5,
+    period + 0.5) for all periods, with one evaluation of the distribution
+    function
+    """
+    edges = np.concatenate(([0.], np.arange(length) + 0.5))
+    return np.diff(distribution.cdf(edges))
+
+
+def __checkParameters(name, parameters, fewest, most):
+    if not fewest <= len(parameters) <= most:
+        raise ValueError(("Too few or too many arguments for %s release " +
+                          "function, got %d. Enter %d or %d arguments.")
+                          % (name, len(parameters), fewest, most))
+
+
+lifetimeKernels = {'lognormal': lognormalKernel,
+                   'gamma': gammaKernel,
+                   'exponential': exponentialKernel}
+
+providers = {
+    'extended': dict(fix=fixedKernel, list=listKernel, rand=randomKernel,
+                     weibull=extendedWeibullKernel, **lifetimeKernels),
+    'simple': dict(fix=fixedKernel, list=listKernel, rand=randomKernel,
+                   weibull=simpleWeibullKernel, **lifetimeKernels),
+    'dweibull': dict(fix=fixedKernel, list=listKernel, rand=randomKernel,
+                     weibull=doubleWeibullKernel, **lifetimeKernels)}
+
+# names of the release functions every provider supports
+releaseFunctions = ['fix', 'list', 'rand', 'weibull', 'lognormal', 'gamma',
+                    'exponential']
+
+
+# release kernels of the deterministic release functions by
+# (provider, name, parameters)
+kernels = {}
+
+def releaseKernel(provider, name, parameters, random = None):
+    """ returns the release kernel of a release function of a provider. The
+    kernels of all release functions except 'rand' are memoized.
+
+    Parameters:
+    ----------------
+    provider: string
+        name of the provider in providers
+    name: string
+        name of the release function
+    parameters: list<float>
+        parameters of the release function
+    random: numpy.random.Generator
+        the random stream of the 'rand' release function (the global numpy \
+        random stream if None)
+    """
+    if name == 'rand':
+        return providers[provider][name](
+            parameters, random=np.random if random is None else random)
+    key = (provider, name, tuple(parameters))
+    if key not in kernels:
+        kernels[key] = providers[provider][name](parameters)
+    return kernels[key]
@@ -21,14 +21,38 @@ import sys
 from lib.entropy_calculation.entropy import EntropyCalc
 from lib.exporter import CSVExporter
 from lib.importer import CSVImporter
+from lib.model_cache import ModelCache
 
 inFileName = sys.argv[1]
 outFileName = sys.argv[2]
 
 def usage():
-  return ("usage: runner_local.py source.csv results.csv\n" +
+  return ("usage: runner_local.py source.csv results.csv [--plot] " +
+          "[--vectorized] [--scc] [--iterative[=TOL]] [--iterative-block=N] " +
+          "[--sparse] " +
+          "[--workers=N] [--memmap] [--streaming] " +
+          "[--sampling=random|lhs|sobol|antithetic] " +
+          "[--common-random-numbers] [--cache=DIR]\n" +
           "source.csv: path to the source file of an analysis.\n" +
-          "results.csv: path to where the results should be stored.\n")
+          "results.csv: path to where the results should be stored.\n" +
+          "--plot: create plots of the results.\n" +
+          "--vectorized: evaluate batches of runs at once.\n" +
+          "--scc: solve the flow systems along the loops of the model.\n" +
+          "--iterative[=TOL]: like --scc, but iterate the loops up to the " +
+          "relative precision TOL (default: 1e-12).\n" +
+          "--iterative-block=N: iterate the loops of at least N " +
+          "compartments, factorize smaller ones (default: 512).\n" +
+          "--sparse: solve the flow systems with sparse matrices.\n" +
+          "--workers=N: distribute the runs over N processes.\n" +
+          "--memmap: store the records of the runs in files next to the " +
+          "results instead of the memory (deleted after the export).\n" +
+          "--streaming: only keep online statistics of the runs.\n" +
+          "--sampling=D: sampling design of the uncertain inputs (default: " +
+          "as defined in the source file or random).\n" +
+          "--common-random-numbers: draw the same random numbers for the " +
+          "links that variants of a model share.\n" +
+          "--cache=DIR: keep parsed and built models in DIR and reuse them " +
+          "for unchanged source files.\n")
 
 if not inFileName or not outFileName:
   print("ERROR: This script requires two arguments")
@@ -46,10 +70,37 @@ if not exporter:
   print(usage())
   sys.exit(1)
 
-importer = CSVImporter()
+modelCache = None
+for arg in sys.argv [1:]:
+  if arg.startswith('--cache='):
+    modelCache = ModelCache(arg[len('--cache='):])
+importer = CSVImporter(modelCache)
 
 print("loading input file...")
 system,concentration = importer.load(inFileName)
+if '--vectorized' in sys.argv [1:]:
+    system.engine = "vectorized"
+if '--scc' in sys.argv [1:]:
+    system.solver = "scc"
+if '--sparse' in sys.argv [1:]:
+    system.solver = "sparse"
+for arg in sys.argv [1:]:
+  if arg == '--iterative' or arg.startswith('--iterative='):
+    system.solver = "iterative"
+    if arg.startswith('--iterative='):
+      system.solverTolerance = float(arg[len('--iterative='):])
+  if arg.startswith('--iterative-block='):
+    system.solverBlockSize = int(arg[len('--iterative-block='):])
+  if arg.startswith('--workers='):
+    system.workers = int(arg[len('--workers='):])
+  if arg.startswith('--sampling='):
+    system.sampling = arg[len('--sampling='):]
+if '--memmap' in sys.argv [1:]:
+    system.recordDirectory = splitext(outFileName)[0] + "_records"
+if '--streaming' in sys.argv [1:]:
+    system.streaming = True
+if '--common-random-numbers' in sys.argv [1:]:
+    system.commonRandomNumbers = True
 print("running analysis...")
 simulator = system.run()
 print("calculating entropy (if Hmax was specified)...")
@@ -59,5 +110,7 @@ doPlot = 0
 if '--plot' in sys.argv [1:]:
     doPlot = 1
 exporter.export(outFileName, system, simulator, entropyResult, doPlot)
+# the files of memory mapped records are not needed after the export
+simulator.deleteRecords()
 
 print("All done.")
\ No newline at end of file
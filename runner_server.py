@@ -17,11 +17,12 @@ modified by dikohl
 This runner is used serverside and was changed to be called after a new file was uploaded.
 """
 
-import sys, argparse
+import os, sys, argparse
 
 from lib.entropy_calculation.entropy import Entropy, EntropyCalc
 from lib.exporter import CSVExporter
 from lib.importer import CSVImporter, CSVParserException
+from lib.model_cache import ModelCache
 
 
 class Runner(object):
@@ -31,6 +32,16 @@ class Runner(object):
         parser = argparse.ArgumentParser()
         parser.add_argument('--plot',action='store_true')
         parser.add_argument('--entropy',default=-10)
+        parser.add_argument('--engine',default='loop',choices=['loop','vectorized'])
+        parser.add_argument('--solver',default='dense',choices=['dense','scc','iterative','sparse'])
+        parser.add_argument('--solver-tolerance',default=None,type=float)
+        parser.add_argument('--solver-block-size',default=None,type=int)
+        parser.add_argument('--workers',default=1,type=int)
+        parser.add_argument('--memmap',action='store_true')
+        parser.add_argument('--streaming',action='store_true')
+        parser.add_argument('--sampling',default=None,choices=['random','lhs','sobol','antithetic'])
+        parser.add_argument('--common-random-numbers',action='store_true')
+        parser.add_argument('--cache',default=None)
         args = parser.parse_args()
 
         self.doPlot = 0
@@ -38,15 +49,45 @@ class Runner(object):
             self.doPlot = 1
 
         self.yearDetail = int(args.entropy)
+        self.engine = args.engine
+        self.solver = args.solver
+        self.solverTolerance = args.solver_tolerance
+        self.solverBlockSize = args.solver_block_size
+        self.workers = args.workers
+        self.streaming = args.streaming
+        self.sampling = args.sampling
+        self.commonRandomNumbers = args.common_random_numbers
+        # parsed and built models are reused for unchanged source files
+        self.modelCache = None
+        if args.cache is not None:
+            self.modelCache = ModelCache(args.cache)
+        # the records of the runs are stored in the analysis directory
+        self.recordDirectory = None
+        if args.memmap:
+            self.recordDirectory = os.path.join(os.path.dirname(inputFile),
+                                                'records')
 
     def run(self):
         exporter = CSVExporter()
-        importer = CSVImporter()
+        importer = CSVImporter(self.modelCache)
         try:
             system, concentration = importer.load(self.inFileName)
+            system.engine = self.engine
+            system.solver = self.solver
+            system.solverTolerance = self.solverTolerance
+            system.solverBlockSize = self.solverBlockSize
+            system.workers = self.workers
+            system.recordDirectory = self.recordDirectory
+            system.streaming = self.streaming
+            system.commonRandomNumbers = self.commonRandomNumbers
+            # the design of the model file is used if none is given
+            if self.sampling is not None:
+                system.sampling = self.sampling
             simulator = system.run()
             entropyResult = EntropyCalc(Entropy(system, simulator, concentration)).computeEntropy(self.yearDetail)
             exporter.export(self.outFileName, system, simulator, entropyResult, self.doPlot)
+            # the files of memory mapped records are not needed after the export
+            simulator.deleteRecords()
             #exporter.export(self.outFileName, system, simulator, self.doPlot)
         except CSVParserException as e:
             return e.error